@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+#
+# bench-scaling
+#
+# Time process_csv on synthetic dumps (see synth.py) of increasing
+# size, phase by phase, to catch code that doesn't scale. Per row cost
+# should stay flat as the size grows.
+#
+# Phases:
+#   read       csv.reader over the file
+#   derive     derive_rows() - JSON parsing, per manifest work
+#   summarize  summarize() - aggregates, table, timeseries
+#   sharded    with --shards N, all of process_csv(shards=N), from the
+#              file to the results. Compare with the sum of the above;
+#              it should come down with the number of cores. Peak
+#              memory is only that of the parent process.
+#
+# Phases are timed --repeat times, and the best time is kept. Then
+# they are run once more under tracemalloc for peak memory
+# (tracemalloc slows things down too much to do both at once).
+#
+# Generated CSVs are kept in --data-dir and reused. Results can be
+# saved as JSON; when a baseline is given, phases that got slower (or
+# bigger) than --tolerance allows are reported, and the exit status
+# is 1.
+#
+# Usage:
+#   ./bench-scaling.py --sizes 1000,10000,100000 --save-baseline base.json
+#   ./bench-scaling.py --sizes 1000,10000,100000 --baseline base.json
+#   ./bench-scaling.py --sizes 1000000 --no-memory
+#   ./bench-scaling.py --sizes 1000000 --no-memory --shards 8
+#   ./bench-scaling.py --sizes 1000000 --no-memory --shards 8 --workers 2
+#
+import argparse
+import contextlib
+import csv
+import gc
+import io
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import stats
+import synth
+
+phases = ["read", "derive", "summarize"]
+
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    "--sizes",
+    default="1000,10000,100000",
+    help="Comma separated manifest counts (default: %(default)s)",
+)
+parser.add_argument("--seed", type=int, default=0, help="Seed for synth.generate()")
+parser.add_argument(
+    "--data-dir",
+    default="bench-data",
+    help="Keep generated CSVs here (default: %(default)s)",
+)
+parser.add_argument("--output", metavar="FILENAME", help="Save results as JSON")
+parser.add_argument(
+    "--baseline", metavar="FILENAME", help="Compare with results saved earlier"
+)
+parser.add_argument(
+    "--save-baseline", metavar="FILENAME", help="Save results as the new baseline"
+)
+parser.add_argument(
+    "--tolerance",
+    type=float,
+    default=0.25,
+    help="Allowed slowdown/growth against the baseline (default: %(default)s)",
+)
+parser.add_argument("--repeat", type=int, default=3, help="Timing repeats")
+parser.add_argument(
+    "--no-memory", action="store_true", help="Skip the peak memory pass"
+)
+parser.add_argument(
+    "--shards", type=int, default=1, help="Also time process_csv with this many shards"
+)
+parser.add_argument(
+    "--workers",
+    type=int,
+    help="Processes for --shards (default: one per CPU, at most --shards)",
+)
+args = parser.parse_args()
+if args.shards > 1:
+    phases.append("sharded")
+
+
+def dataset(n):
+    os.makedirs(args.data_dir, exist_ok=True)
+    path = os.path.join(args.data_dir, f"synth-{n}-{args.seed}.csv")
+    if not os.path.exists(path):
+        print(f"Generating {path}...", file=sys.stderr)
+        with open(path + ".tmp", "w", encoding="utf-8", newline="") as fp:
+            synth.generate(n, fp, args.seed)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def run_phases(path, measure):
+    """Run the phases on path. measure(name) is a context manager
+    wrapped around each phase"""
+    # summarize() notes every disabled/broken manifest on stdout
+    with contextlib.redirect_stdout(io.StringIO()):
+        with open(path, encoding="utf-8", newline="") as csvfile:
+            with measure("read"):
+                rows = list(itertools.islice(csv.reader(csvfile), 2, None))
+        with measure("derive"):
+            derived = stats.derive_rows(rows)
+        with measure("summarize"):
+            stats.summarize(derived)
+        if args.shards > 1:
+            # Forked shards would otherwise carry (and garbage collect
+            # over) the rows of the phases above
+            del rows, derived
+            with open(path, encoding="utf-8", newline="") as csvfile:
+                with measure("sharded"):
+                    stats.process_csv(
+                        csvfile, workers=args.workers, shards=args.shards
+                    )
+
+
+def time_phases(path):
+    result = {}
+
+    @contextlib.contextmanager
+    def measure(name):
+        gc.collect()
+        start = time.perf_counter()
+        yield
+        result[name] = time.perf_counter() - start
+
+    run_phases(path, measure)
+    return result
+
+
+def memory_phases(path):
+    result = {}
+
+    @contextlib.contextmanager
+    def measure(name):
+        gc.collect()
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        yield
+        result[name] = tracemalloc.get_traced_memory()[1] - current
+
+    tracemalloc.start()
+    try:
+        run_phases(path, measure)
+    finally:
+        tracemalloc.stop()
+    return result
+
+
+results = {
+    "python": platform.python_version(),
+    "machine": platform.machine(),
+    "seed": args.seed,
+    "sizes": {},
+}
+print(f"{'manifests':>10s} phase      {'seconds':>9s} {'us/row':>8s} {'peak MB':>8s}")
+for n in [int(size) for size in args.sizes.split(",")]:
+    path = dataset(n)
+    runs = [time_phases(path) for _ in range(args.repeat)]
+    seconds = {phase: min(run[phase] for run in runs) for phase in phases}
+    peak = {} if args.no_memory else memory_phases(path)
+    size_result = {}
+    for phase in phases:
+        size_result[phase] = {"seconds": seconds[phase]}
+        if phase in peak:
+            size_result[phase]["peak_bytes"] = peak[phase]
+        mb = f"{peak[phase] / 2**20:8.1f}" if phase in peak else f"{'-':>8s}"
+        print(
+            f"{n:10d} {phase:10s} {seconds[phase]:9.3f} "
+            f"{seconds[phase] / n * 1e6:8.1f} {mb}"
+        )
+    results["sizes"][str(n)] = size_result
+
+for path in [args.output, args.save_baseline]:
+    if path:
+        with open(path, "w") as fp:
+            json.dump(results, fp, indent=2)
+
+if not args.baseline:
+    sys.exit(0)
+
+with open(args.baseline) as fp:
+    baseline = json.load(fp)
+regressions = 0
+for n, size_result in results["sizes"].items():
+    if n not in baseline["sizes"]:
+        continue
+    for phase, measured in size_result.items():
+        for key, value in measured.items():
+            base = baseline["sizes"][n].get(phase, {}).get(key)
+            if not base:
+                continue
+            ratio = value / base
+            if ratio > 1 + args.tolerance:
+                regressions += 1
+                print(
+                    f"REGRESSION {n} {phase} {key}: "
+                    f"{base:.6g} -> {value:.6g} ({ratio:.2f}x)"
+                )
+if regressions:
+    sys.exit(1)
+print("No regressions against", args.baseline)
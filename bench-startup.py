@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+#
+# bench-startup
+#
+# Check that the tools start quickly: time the imports done before
+# any work starts (python -X importtime), and make sure the plotting
+# and imaging stack isn't among them. Those are only to be imported
+# by --word-cloud, --funding-pie etc.
+#
+# Exits with status 1 if a command goes over the budget, or imports
+# a heavy module.
+#
+# Usage:
+#   ./bench-startup.py
+#   ./bench-startup.py --budget 150 --top 10
+#
+import argparse
+import os
+import subprocess
+import sys
+
+commands = {
+    "stats": ["-c", "import stats"],
+    "manifest-show.py": ["manifest-show.py", "--help"],
+    "fm-stats.py": ["fm-stats.py", "--help"],
+}
+heavy = ["matplotlib", "pandas", "PIL", "wordcloud", "dateutil"]
+
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    "--budget",
+    type=float,
+    default=250,
+    help="Maximum import time per command, in ms (default: %(default)s)",
+)
+parser.add_argument("--repeat", type=int, default=3, help="Timing repeats")
+parser.add_argument("--top", type=int, default=5, help="Show the slowest imports")
+args = parser.parse_args()
+
+
+def import_times(cmd_args):
+    """{module: (self us, cumulative us, depth)} of one run"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *cmd_args],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative, name = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            continue  # column headings
+        depth = (len(name) - len(name.lstrip())) // 2
+        times[name.strip()] = (int(self_us), int(cumulative), depth)
+    return times
+
+
+failed = False
+for label, cmd_args in commands.items():
+    runs = [import_times(cmd_args) for _ in range(args.repeat)]
+    totals = [
+        sum(cumulative for self_us, cumulative, depth in run.values() if depth == 0)
+        for run in runs
+    ]
+    total_ms = min(totals) / 1000
+    times = runs[totals.index(min(totals))]
+    loaded = [mod for mod in heavy if mod in times]
+    over = total_ms > args.budget
+    status = "FAIL" if over or loaded else "ok"
+    print(f"{label:18s}: {total_ms:8.1f} ms (budget {args.budget:.0f} ms) {status}")
+    if loaded:
+        print(f"  imports {', '.join(loaded)}")
+    top = sorted(times.items(), key=lambda kv: kv[1][0], reverse=True)
+    for name, (self_us, cumulative, depth) in top[: args.top]:
+        print(f"  {self_us / 1000:8.1f} ms {name}")
+    failed = failed or over or bool(loaded)
+
+sys.exit(1 if failed else 0)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+#
+# bench-timestamps
+#
+# Compare per row cost of timestamp parsing: fuzzy dateutil (what
+# process_csv used to do) vs stats.parse_timestamp.
+#
+# Usage:
+#   ./bench-timestamps.py                      # built-in samples
+#   ./bench-timestamps.py data/funding-manifests.csv
+#
+import argparse
+import csv
+import itertools
+import timeit
+import dateutil.parser
+import stats
+
+samples = [
+    "2024-10-15 10:46:05.123456+00",
+    "2024-11-02 03:12:45.5+00",
+    "2025-01-20T18:00:00Z",
+    "2025-08-19 09:30:00+05:30",
+]
+
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    "manifest",
+    metavar="funding-manifest.csv",
+    nargs="?",
+    help="Use created_at/updated_at values from this file",
+)
+parser.add_argument("--rows", type=int, default=2000, help="Rows to sample")
+parser.add_argument("--repeat", type=int, default=5, help="Timing repeats")
+args = parser.parse_args()
+
+if args.manifest:
+    with open(args.manifest, encoding="utf-8", newline="") as csvfile:
+        rows = itertools.islice(csv.reader(csvfile), 2, 2 + args.rows)
+        values = [val for row in rows for val in row[2:4]]
+else:
+    values = samples * (args.rows // 2)
+
+
+def run_dateutil():
+    for val in values:
+        dateutil.parser.parse(val, fuzzy=True)
+
+
+def run_stats():
+    for val in values:
+        stats.parse_timestamp(val)
+
+
+slow = sum(stats.parse_timestamp(val)[1] for val in values)
+t_dateutil = min(timeit.repeat(run_dateutil, number=1, repeat=args.repeat))
+t_stats = min(timeit.repeat(run_stats, number=1, repeat=args.repeat))
+# two timestamps per row
+us_row_dateutil = t_dateutil / len(values) * 2 * 1e6
+us_row_stats = t_stats / len(values) * 2 * 1e6
+print(f"timestamps          : {len(values)} ({slow} took the slow path)")
+print(f"dateutil (fuzzy)    : {us_row_dateutil:8.2f} us/row")
+print(f"stats.parse_timestamp : {us_row_stats:8.2f} us/row")
+print(f"speedup             : {t_dateutil / t_stats:8.1f}x")
@@ -0,0 +1,167 @@
+#
+# fetch
+#
+# Get the funding manifest dump from dir.floss.fund
+#
+# The dump is a tar.gz holding a single CSV file. Rather than
+# downloading it, and making copies in memory, we decompress
+# the HTTP body as it arrives, and hand out the CSV as a text
+# stream. csv.reader pulls lines from that, so at any point in
+# time we only hold about one row's worth of the dump.
+#
+# The dump changes at most once a day. SnapshotCache remembers
+# what we computed for a snapshot (by its ETag/Last-Modified),
+# and asks the server only for newer content.
+#
+import collections
+import contextlib
+import io
+import os
+import tarfile
+import threading
+import time
+import requests
+
+manifest_tgz = "https://dir.floss.fund/funding-manifests.tar.gz"
+manifest_csv = "funding-manifests.csv"
+
+
+class _Sequential(io.RawIOBase):
+    # tarfile members in stream mode blow up when asked if they are
+    # seekable, which is the first thing TextIOWrapper does.
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def readinto(self, buf):
+        return self.fileobj.readinto(buf)
+
+
+@contextlib.contextmanager
+def open_csv_stream(fileobj, member=manifest_csv, text=True):
+    """Open the CSV inside a tar.gz stream as a text file.
+
+    fileobj is only read sequentially, so a socket/HTTP body works.
+    With text=False, the CSV is a binary file.
+    """
+    # "r|gz" is the streaming variant - no seeks, decompress as we go
+    with tarfile.open(fileobj=fileobj, mode="r|gz") as mzip:
+        for tinfo in mzip:
+            if os.path.normpath(tinfo.name) != member:
+                continue
+            # newline="" as recommended for csv.reader - JSON in the
+            # CSV can have embedded newlines
+            member_fp = io.BufferedReader(_Sequential(mzip.extractfile(tinfo)))
+            if text:
+                yield io.TextIOWrapper(member_fp, encoding="utf-8", newline="")
+            else:
+                yield member_fp
+            return
+    raise KeyError(f"{member} not found in archive")
+
+
+@contextlib.contextmanager
+def open_url(url=manifest_tgz):
+    """Stream the CSV from the tar.gz at url"""
+    with requests.get(url, stream=True) as rg:
+        rg.raise_for_status()
+        # let urllib3 undo any transfer compression for us
+        rg.raw.decode_content = True
+        with open_csv_stream(rg.raw) as csvfile:
+            yield csvfile
+
+
+def snapshot_key(headers):
+    """Identify a snapshot of the dump from its HTTP response headers"""
+    etag = headers.get("etag")
+    last_modified = headers.get("last-modified")
+    if etag is None and last_modified is None:
+        return None
+    return (etag, last_modified)
+
+
+class SnapshotCache:
+    """Cache of process(csvfile) results, one per snapshot of the dump.
+
+    Revalidates with If-None-Match/If-Modified-Since, at most once
+    every max_age seconds. A 304 reuses the stored result. Only the
+    newest max_snapshots results are retained. bytes_saved adds up
+    the sizes (Content-Length) of the bodies that weren't downloaded
+    again.
+    """
+
+    def __init__(self, process, max_snapshots=2, max_age=300):
+        self.process = process
+        self.max_snapshots = max_snapshots
+        self.max_age = max_age
+        self.results = collections.OrderedDict()
+        self.sizes = {}  # key => Content-Length of the snapshot
+        self.latest = {}  # url => (key, time of last check)
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        # streamlit serves sessions from threads. One download
+        # at a time is plenty.
+        self.lock = threading.Lock()
+
+    def get(self, url=manifest_tgz):
+        return self.get_keyed(url)[1]
+
+    def get_keyed(self, url=manifest_tgz):
+        """(key, result) - key identifies the snapshot result is for,
+        it's None if the server doesn't say"""
+        with self.lock:
+            return self._get(url)
+
+    def _get(self, url):
+        key, checked_at = self.latest.get(url, (None, 0))
+        if key in self.results and time.monotonic() - checked_at < self.max_age:
+            self.hits += 1
+            return key, self.results[key]
+
+        headers = {}
+        if key in self.results:
+            etag, last_modified = key
+            if etag is not None:
+                headers["If-None-Match"] = etag
+            if last_modified is not None:
+                headers["If-Modified-Since"] = last_modified
+
+        with requests.get(url, headers=headers, stream=True) as rg:
+            if rg.status_code == 304:
+                self.hits += 1
+                self.bytes_saved += self.sizes.get(key) or 0
+                self.latest[url] = (key, time.monotonic())
+                self.results.move_to_end(key)
+                return key, self.results[key]
+            rg.raise_for_status()
+            key = snapshot_key(rg.headers)
+            if key in self.results:
+                # Server ignored our conditional request, but the
+                # snapshot is one we know
+                self.hits += 1
+                self.bytes_saved += self.sizes.get(key) or 0
+                result = self.results[key]
+            else:
+                self.misses += 1
+                rg.raw.decode_content = True
+                with open_csv_stream(rg.raw) as csvfile:
+                    result = self.process(csvfile)
+                if key is None:
+                    # No way to tell snapshots apart, so nothing to cache
+                    return key, result
+                self.results[key] = result
+                size = rg.headers.get("content-length")
+                self.sizes[key] = int(size) if size and size.isdigit() else None
+
+        self.latest[url] = (key, time.monotonic())
+        self.results.move_to_end(key)
+        while len(self.results) > self.max_snapshots:
+            old, _ = self.results.popitem(last=False)
+            self.sizes.pop(old, None)
+        return key, result
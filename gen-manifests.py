@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+#
+# gen-manifests
+#
+# Write a synthetic funding-manifests.csv (see synth.py)
+#
+# Usage:
+#   ./gen-manifests.py 100000 > data/synth-100k.csv
+#   ./gen-manifests.py 1000000 --seed 7 --output data/synth-1m.csv
+#
+import argparse
+import sys
+import synth
+
+parser = argparse.ArgumentParser()
+parser.add_argument("manifests", type=int, help="Number of manifests to generate")
+parser.add_argument("--seed", type=int, default=0, help="Random seed")
+parser.add_argument(
+    "--output", metavar="FILENAME", help="Write here instead of standard output"
+)
+args = parser.parse_args()
+
+if args.output:
+    with open(args.output, "w", encoding="utf-8", newline="") as fp:
+        synth.generate(args.manifests, fp, args.seed)
+else:
+    synth.generate(args.manifests, sys.stdout, args.seed)
@@ -7,43 +7,144 @@ from pprint import pprint
 import sqlite3
 import sqlite3_adapters
 import argparse
+import math
 import sys
-import hashlib
+import fetch
+import manifest_db
+import stats
 
 # This program assumes the sqlite3 db follows this schema:
 # sqlite> .schema mdb_history
 # CREATE TABLE mdb_history(fetched_at DATETIME, url TEXT, last_modified DATETIME, data BLOB);
+#
+# md5 and size columns, and an index on last_modified are added
+# (and filled in) on first use.
+#
+# With --store dedup, snapshots go to the deduplicated store instead
+# (tables are created as needed). See manifest_db.py
 
 
 def dtformat(dt):
     return dt.strftime("%a, %-d %b %Y %H:%M:%S %Z")
 
 
-def update_hist(url, conn):
-    result = requests.get(url, stream=True)
-    # HTTP dates are in "GMT". We report in UTC, which is same...
-    mod_ts = email.utils.parsedate_to_datetime(result.headers["last-modified"])
-    print(f"Funding manifest db was last updated at {dtformat(mod_ts)}")
-    cursor = conn.cursor()
-    qr = cursor.execute("SELECT * from mdb_history where last_modified = ?", (mod_ts,))
-    fetchedData = qr.fetchone()
-    if not fetchedData:
-        print(f"Inserting manifest db for {mod_ts}")
-        now = datetime.datetime.now(datetime.UTC)
-        res = cursor.execute(
-            "INSERT INTO mdb_history VALUES(?, ?, ?, ?)",
-            (now, url, mod_ts, result.content),
+def update_hist(url, conn, store):
+    # Only ask for the dump if it's newer than what we have
+    latest_ts, latest_size = manifest_db.latest_snapshot(conn, store)
+    headers = {}
+    if latest_ts is not None:
+        headers["If-Modified-Since"] = email.utils.format_datetime(
+            latest_ts.astimezone(datetime.UTC), usegmt=True
         )
-        conn.commit()
-    else:
+    with requests.get(url, headers=headers, stream=True) as result:
+        if result.status_code == 304:
+            print(f"Funding manifest db not modified since {dtformat(latest_ts)}")
+            report_saved(latest_size)
+            return
+        result.raise_for_status()
+        # HTTP dates are in "GMT". We report in UTC, which is same...
+        mod_ts = email.utils.parsedate_to_datetime(result.headers["last-modified"])
+        print(f"Funding manifest db was last updated at {dtformat(mod_ts)}")
+        if store == "dedup":
+            update_dedup(url, conn, result, mod_ts)
+            return
+        cursor = conn.cursor()
+        qr = cursor.execute(
+            "SELECT 1 from mdb_history where last_modified = ?", (mod_ts,)
+        )
+        fetchedData = qr.fetchone()
+        if not fetchedData:
+            print(f"Inserting manifest db for {mod_ts}")
+            now = datetime.datetime.now(datetime.UTC)
+            manifest_db.insert_history(
+                conn, now, url, mod_ts, result.iter_content(manifest_db.chunk_size)
+            )
+            conn.commit()
+        else:
+            # Server ignored If-Modified-Since. We still don't read the body.
+            print(f"... it is already available in history")
+            report_saved(result.headers.get("content-length"))
+        cursor.close()
+
+
+def report_saved(size):
+    if size is not None:
+        print(f"... skipped downloading {size} bytes")
+
+
+def update_dedup(url, conn, result, mod_ts):
+    manifest_db.init_dedup(conn)
+    if manifest_db.has_snapshot(conn, mod_ts):
         print(f"... it is already available in history")
-    cursor.close()
+        report_saved(result.headers.get("content-length"))
+        return
+    print(f"Inserting manifest db for {mod_ts}")
+    now = datetime.datetime.now(datetime.UTC)
+    result.raw.decode_content = True
+    with fetch.open_csv_stream(result.raw, text=False) as csvfile:
+        nrecords, added = manifest_db.store_dedup(conn, now, url, mod_ts, csvfile)
+    conn.commit()
+    print(f"{nrecords} records, {added} of them new")
+
+
+def dedup_history(conn):
+    for mod_ts, nrecords, added in manifest_db.dedup_history(conn):
+        print(f"{dtformat(mod_ts)}: {nrecords} records, {added} of them new")
+
+
+def show_snapshots(conn):
+    rows = manifest_db.snapshots(conn)
+    if not rows:
+        print("No records are available")
+    for snapshot, mod_ts, fetched_at, url, nrecords in reversed(rows):
+        print(f"Snapshot {snapshot}, fetched at {dtformat(fetched_at)},")
+        print(f"  from {url},")
+        print(f"   which was last modified at {dtformat(mod_ts)}")
+        print(f"   {nrecords} records")
+
+
+def export_csv(conn, snapshot, save_to):
+    rows = manifest_db.snapshots(conn)
+    if snapshot is None and rows:
+        snapshot = rows[-1][0]
+    if snapshot not in [row[0] for row in rows]:
+        print("No such snapshot")
+        return
+    print(f"Saving snapshot {snapshot} to {save_to}...")
+    with open(save_to, "wb") as fp:
+        manifest_db.export_csv(conn, snapshot, fp)
+
+
+def replay(conn, store):
+    timeline = stats.replay_snapshots(manifest_db.iter_snapshots(conn, store))
+    tracked = ["status", "url", "max-fr", "plans", "fin_totals"]
+    for rid, changes in timeline.items():
+        # Nothing to say about manifests that never changed
+        if len(changes) < 2:
+            continue
+        print(f"Manifest {rid} ({changes[-1]['url']})")
+        prev = {}
+        for change in changes:
+            diffs = [
+                key for key in tracked if key in change and change[key] != prev.get(key)
+            ]
+            desc = [change["status"]]
+            if "max-fr" in diffs:
+                desc.append(f"max-fr {math.floor(change['max-fr'])}")
+            if "plans" in diffs and "plans" in prev:
+                desc.append("plans changed")
+            if "fin_totals" in diffs:
+                desc.append(f"financials {change['fin_totals']}")
+            if "url" in diffs and prev:
+                desc.append(f"moved to {change['url']}")
+            print(f"  {dtformat(change['at'])}: {', '.join(desc)}")
+            prev = change
 
 
 def show_latest(conn, save_to):
     cursor = conn.cursor()
     qr = cursor.execute(
-        "SELECT last_modified, url, fetched_at, data FROM mdb_history ORDER BY last_modified ASC"
+        "SELECT last_modified, url, fetched_at, rowid FROM mdb_history ORDER BY last_modified DESC"
     )
     fetchedData = qr.fetchone()
     if not fetchedData:
@@ -55,14 +156,14 @@ def show_latest(conn, save_to):
         if save_to:
             print(f"Saving {fetchedData[1]} to {save_to}...")
             with open(save_to, "wb") as fp:
-                fp.write(fetchedData[3])
+                manifest_db.export_history(conn, fetchedData[3], fp)
     cursor.close()
 
 
 def show_all(conn):
     cursor = conn.cursor()
     qr = cursor.execute(
-        "SELECT last_modified, url, fetched_at, data FROM mdb_history ORDER BY last_modified DESC"
+        "SELECT last_modified, url, fetched_at, md5, size FROM mdb_history ORDER BY last_modified DESC"
     )
     rec = qr.fetchone()
     if not rec:
@@ -73,47 +174,119 @@ def show_all(conn):
             print(f"Fetched at {dtformat(fetchedData[2])},")
             print(f"  from {fetchedData[1]},")
             print(f"   which was last modified at {dtformat(fetchedData[0])}")
-            print("   md5sum = ", hashlib.md5(fetchedData[3]).hexdigest())
+            print("   md5sum = ", fetchedData[3])
+            print("   size = ", fetchedData[4])
             rec = qr.fetchone()
     cursor.close()
 
 
-parser = argparse.ArgumentParser()
-group = parser.add_mutually_exclusive_group(required=True)
-group.add_argument("--update", action="store_true", help="Update from dir.floss.fund")
-group.add_argument(
-    "--show-latest",
-    action="store_true",
-    help="Show latest record stored in manifest history",
-)
-group.add_argument(
-    "--show-all",
-    action="store_true",
-    help="Show records stored in manifest history",
-)
-parser.add_argument(
-    "--save-to",
-    metavar="FILENAME",
-    help="Save data to this file, use with --show-latest",
-)
-args = parser.parse_args()
-
-if args.save_to and not args.show_latest:
-    print("ERROR: --save-to may only be used with --show-latest")
-    sys.exit(1)
-sqlite3_adapters.register_datetime()
-# funding-manifests-evolution is a separate git repository
-conn = sqlite3.connect(
-    "funding-manifests-evolution/dir.floss.fund.db",
-    detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
-)
-
-if args.update:
-    url = "https://dir.floss.fund/funding-manifests.tar.gz"
-    update_hist(url, conn)
-elif args.show_latest:
-    show_latest(conn, args.save_to)
-elif args.show_all:
-    show_all(conn)
-
-conn.close()
+def main():
+    parser = argparse.ArgumentParser()
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument(
+        "--update", action="store_true", help="Update from dir.floss.fund"
+    )
+    group.add_argument(
+        "--show-latest",
+        action="store_true",
+        help="Show latest record stored in manifest history",
+    )
+    group.add_argument(
+        "--show-all",
+        action="store_true",
+        help="Show records stored in manifest history",
+    )
+    group.add_argument(
+        "--dedup-history",
+        action="store_true",
+        help="Copy all records into the deduplicated store",
+    )
+    group.add_argument(
+        "--show-snapshots",
+        action="store_true",
+        help="Show snapshots in the deduplicated store",
+    )
+    group.add_argument(
+        "--replay",
+        action="store_true",
+        help="Show how manifests changed over all stored snapshots",
+    )
+    group.add_argument(
+        "--summarize",
+        action="store_true",
+        help="Compute stats of every stored snapshot that hasn't been summarized yet",
+    )
+    group.add_argument(
+        "--export-csv",
+        metavar="FILENAME",
+        help="Save the CSV of a snapshot in the deduplicated store (default: latest)",
+    )
+    parser.add_argument(
+        "--save-to",
+        metavar="FILENAME",
+        help="Save data to this file, use with --show-latest",
+    )
+    parser.add_argument(
+        "--store",
+        choices=["blob", "dedup"],
+        default="blob",
+        help="With --update, store the tar.gz as is (blob), or deduplicated. With --replay/--summarize, store to read",
+    )
+    parser.add_argument(
+        "--url",
+        default="https://dir.floss.fund/funding-manifests.tar.gz",
+        help="Where --update gets the funding manifests from",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Processes to use for --summarize (default: one per CPU)",
+    )
+    parser.add_argument(
+        "--snapshot",
+        type=int,
+        help="Snapshot to use with --export-csv",
+    )
+    args = parser.parse_args()
+
+    if args.save_to and not args.show_latest:
+        print("ERROR: --save-to may only be used with --show-latest")
+        sys.exit(1)
+    if args.snapshot is not None and not args.export_csv:
+        print("ERROR: --snapshot may only be used with --export-csv")
+        sys.exit(1)
+    sqlite3_adapters.register_datetime()
+    # funding-manifests-evolution is a separate git repository
+    db_path = "funding-manifests-evolution/dir.floss.fund.db"
+    conn = sqlite3.connect(
+        db_path,
+        detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+    )
+    if manifest_db.init_history(conn):
+        print("Computed md5sum/size of records in history")
+
+    if args.update:
+        update_hist(args.url, conn, args.store)
+    elif args.show_latest:
+        show_latest(conn, args.save_to)
+    elif args.show_all:
+        show_all(conn)
+    elif args.dedup_history:
+        dedup_history(conn)
+    elif args.show_snapshots:
+        show_snapshots(conn)
+    elif args.replay:
+        replay(conn, args.store)
+    elif args.summarize:
+        for mod_ts in manifest_db.summarize_history(
+            conn, db_path, args.store, args.workers
+        ):
+            print(f"Summarized snapshot last modified at {dtformat(mod_ts)}")
+    elif args.export_csv:
+        export_csv(conn, args.snapshot, args.export_csv)
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -17,11 +17,15 @@
 # Note that there is an element of randomness in the word clouds.
 #
 import argparse
+import sys
+import manifest_index
+import results_cache
 import stats
 from pprint import pprint
 import math
-import pandas as pd
-import matplotlib.pyplot as plt
+
+# Plotting/imaging modules are imported by the options that need them,
+# a plain dump shouldn't pay for them.
 
 
 def dtformat(dt):
@@ -42,10 +46,213 @@ parser.add_argument(
 parser.add_argument(
     "--funding-bar", action="store_true", help="Plot funding bars (projects in range)"
 )
+parser.add_argument(
+    "--state",
+    metavar="FILENAME",
+    help="Keep parsed manifests in this file, and only parse rows changed since the "
+    "last run (all rows are still summarized)",
+)
+parser.add_argument(
+    "--workers",
+    type=int,
+    help="Parse manifests using this many processes",
+)
+parser.add_argument(
+    "--shards",
+    type=int,
+    default=1,
+    help="Split the file into this many parts, each read and parsed in a "
+    "process of its own (at most --workers at a time, one per CPU by default)",
+)
+parser.add_argument(
+    "--profile",
+    action="store_true",
+    help="Show where the time goes. Skips the results cache",
+)
+parser.add_argument(
+    "--profile-memory",
+    action="store_true",
+    help="With --profile, also trace memory allocated per phase (slow)",
+)
+parser.add_argument(
+    "--cache-dir",
+    metavar="DIR",
+    default=results_cache.default_dir,
+    help="Reuse results computed earlier for the same file, kept here (default: %(default)s)",
+)
+parser.add_argument(
+    "--cache-size",
+    type=int,
+    metavar="MB",
+    default=results_cache.default_max_bytes // (1024 * 1024),
+    help="Limit the cache directory to this size (default: %(default)s)",
+)
+parser.add_argument(
+    "--no-cache",
+    action="store_true",
+    help="Always process the file, don't use or update the results cache",
+)
+parser.add_argument("--id", help="Only show the manifest with this id")
+parser.add_argument("--url", help="Only show the manifest at this URL")
+parser.add_argument("--name", help="Only show manifests of the entity with this name")
+parser.add_argument(
+    "--index",
+    metavar="FILENAME",
+    help="Index used by --id/--url/--name (default: funding-manifest.csv.idx)",
+)
+parser.add_argument(
+    "--entity", help="Only show manifests of entities whose name contains this"
+)
+parser.add_argument("--tag", help="Only show manifests with a project tagged this")
+parser.add_argument(
+    "--license", help="Only show manifests with a project under this licence"
+)
+parser.add_argument(
+    "--currency", help="Only show manifests with a funding plan in this currency"
+)
+parser.add_argument(
+    "--etype",
+    choices=["individual", "organisation", "group"],
+    help="Only show manifests of this entity type",
+)
+parser.add_argument(
+    "--min-fr",
+    type=float,
+    metavar="USD",
+    help="Only show manifests asking for at least this much",
+)
+parser.add_argument(
+    "--resample",
+    choices=["week", "month"],
+    help="Show new entities/funding per calendar week or month. "
+    "--funding-trend plots those instead of days",
+)
+parser.add_argument(
+    "--rolling",
+    type=int,
+    metavar="DAYS",
+    help="Show new entities/funding as trailing DAYS-day sums, "
+    "for --funding-trend too",
+)
 args = parser.parse_args()
+if args.shards > 1 and args.state:
+    parser.error("--state can't be used with --shards")
+if args.rolling is not None and args.rolling < 1:
+    parser.error("--rolling needs at least 1 day")
+
 
-csvfile = open(args.manifest, encoding="utf-8")
-info, timeseries = stats.process_csv(csvfile)
+def print_manifest(minfo, label=None):
+    created_at = minfo["created_at"]
+    updated_at = minfo["updated_at"]
+    mf = minfo["funding-plan-max"]["max-fr"]
+    first = [] if label is None else [label]
+    print(*first, minfo["url"], f"(Project ID: {minfo['id']})")
+    if minfo["nfl"] > 0:
+        print("  Non-free licences: ", minfo["nfl"])
+    print("  Licenses : ", minfo["licences"])
+    print("  Entity Type : ", minfo["etype"])
+    print("  Max funding requested : ", mf)
+    print("  Financial totals: ", minfo["fin_totals"])
+    print("  Created:", dtformat(created_at))
+    if created_at != updated_at:
+        diff = updated_at - created_at
+        print("  Updated:", dtformat(updated_at), f"({diff})")
+
+
+def lookup():
+    # Single manifests come straight from the CSV, through the index.
+    # No need to process all of it.
+    with manifest_index.ManifestIndex(args.manifest, args.index) as index:
+        if args.id:
+            rows = [index.by_id(args.id)]
+        elif args.url:
+            rows = [index.by_url(args.url)]
+        else:
+            rows = index.by_name(args.name)
+    rows = [row for row in rows if row is not None]
+    if not rows:
+        print("No such manifest")
+    for row in rows:
+        status, minfo, err, slow_dates = stats.derive_mdesc(row)
+        if err is not None:
+            print(minfo["url"], f"(Project ID: {minfo['id']})")
+            print("  Manifest can't be parsed:", err)
+        elif status != "active":
+            print(minfo["url"], f"(Project ID: {minfo['id']})")
+            print("  Status:", status)
+        else:
+            print_manifest(minfo, label=minfo["ename"])
+
+
+if args.id or args.url or args.name:
+    lookup()
+    sys.exit(0)
+
+
+def query():
+    # Rows that can't match are skipped on their raw text, most are
+    # never parsed. Nothing is cached, and there's no summary.
+    q = stats.Query(
+        entity=args.entity,
+        tag=args.tag,
+        license=args.license,
+        currency=args.currency,
+        etype=args.etype,
+        min_fr=args.min_fr,
+    )
+    with open(args.manifest, "rb") as fp:
+        records, counts = stats.query_csv(fp, q)
+    for minfo in records:
+        print_manifest(minfo, label=minfo["ename"])
+    print(
+        f"{len(records)} matching manifests. Parsed {counts['parsed']} "
+        f"of {counts['rows']} rows, {counts['prefiltered']} skipped unparsed."
+    )
+
+
+query_options = [
+    args.entity,
+    args.tag,
+    args.license,
+    args.currency,
+    args.etype,
+    args.min_fr,
+]
+if any(option is not None for option in query_options):
+    query()
+    sys.exit(0)
+
+
+def process_manifest():
+    profile = None
+    if args.profile:
+        profile = stats.Profile(memory=args.profile_memory)
+    csvfile = open(args.manifest, encoding="utf-8", newline="")
+    if args.shards > 1:
+        result = stats.process_csv(
+            csvfile, workers=args.workers, profile=profile, shards=args.shards
+        )
+    elif args.state:
+        state = stats.load_state(args.state)
+        result = stats.process_csv(csvfile, state, args.workers, profile)
+        stats.save_state(state, args.state)
+    else:
+        result = stats.process_csv(csvfile, workers=args.workers, profile=profile)
+    csvfile.close()
+    return result
+
+
+if args.no_cache or args.profile:
+    info, timeseries = process_manifest()
+else:
+    cache_key = results_cache.cache_key(args.manifest)
+    result = results_cache.load(cache_key, args.cache_dir)
+    if result is None:
+        result = process_manifest()
+        results_cache.store(
+            cache_key, result, args.cache_dir, args.cache_size * 1024 * 1024
+        )
+    info, timeseries = result
 
 
 def dump_stats():
@@ -53,6 +260,8 @@ def dump_stats():
     print(
         f"Total manifests = {info.nr} Disabled = {info.disabled} Errors = {info.errors}"
     )
+    if info.slow_dates:
+        print(f"Timestamps not in ISO 8601 format = {info.slow_dates}")
     print(f"Manifests above funding threshold = {info.meets_ft}")
     print(f"Manifests requesting NO SPECIFIC (0) funding = {info.manifests_zfr}")
     print("Cumulative financials for all years reported in manifests:")
@@ -82,8 +291,7 @@ def dump_stats():
     for mcp in info.mc_projects:
         emdesc = mcp["mdesc"]
         url = emdesc["url"]
-        manifest = emdesc["manifest"]
-        ename = manifest["entity"]["name"]
+        ename = emdesc["ename"]
         max_fr = math.floor(emdesc["funding-plan-max"]["max-fr"])
         print(f"  {mcp['currencies']} {url} {ename} {max_fr}")
     print("Entities with more than 1 funding request(manifest):")
@@ -102,21 +310,7 @@ def dump_stats():
             print()
             print(f"-- Manifests below funding threshold {stats.ft//1000}k USD --")
             print()
-        created_at = minfo["created_at"]
-        updated_at = minfo["updated_at"]
-        mf = minfo["funding-plan-max"]["max-fr"]
-        manifest = minfo["manifest"]
-        print(idx + 1, minfo["url"], f"(Project ID: {minfo['id']})")
-        if minfo["nfl"] > 0:
-            print("  Non-free licences: ", minfo["nfl"])
-        print("  Licenses : ", minfo["licences"])
-        print("  Entity Type : ", manifest["entity"]["type"])
-        print("  Max funding requested : ", mf)
-        print("  Financial totals: ", minfo["fin_totals"])
-        print("  Created:", dtformat(created_at))
-        if created_at != updated_at:
-            diff = updated_at - created_at
-            print("  Updated:", dtformat(updated_at), f"({diff})")
+        print_manifest(minfo, label=idx + 1)
     print("Entities below lower threshold = ", len(info.fr_below_ft))
 
 
@@ -157,6 +351,19 @@ def dump_trends():
 
 dump_stats()
 # dump_trends()
+# Resampled trend
+trend = None
+if args.resample:
+    trend = stats.resample(timeseries, args.resample)
+elif args.rolling is not None:
+    trend = stats.rolling(timeseries, args.rolling)
+if trend is not None:
+    for line in stats.trend_report(trend):
+        print(line)
+if info.profile:
+    print("Profile:")
+    for line in info.profile.report():
+        print(" ", line)
 
 # list of funding requests, clipped to the range (10-100k)
 # source : https://www.rapidtables.com/web/color/purple-color.html
@@ -188,6 +395,10 @@ def val2color(fr):
 
 # Generate word cloud with tags
 if args.word_cloud:
+    import numpy as np
+    import wordcloud
+    from PIL import Image
+
     # One with the floss flower mask
     floss_mask = np.array(Image.open("images/mask-floss-fund-logo.png"))
     wc = wordcloud.WordCloud(
@@ -196,24 +407,26 @@ if args.word_cloud:
         contour_width=5,
         contour_color="#2ea650",
     )
-    wc.fit_words(tag_count)
+    wc.fit_words(info.tag_count)
     wc.to_file("floss_fund_tags.png")
 
     # One for "unused" tags. These all have count=1
     wc2 = wordcloud.WordCloud(background_color="white", width=400, height=400)
-    wc2.fit_words(unused_tags)
+    wc2.fit_words(info.unused_tags)
     wc2.to_file("unused_tags.png")
 
     # One for "unused" tags. These all have count=1
-    print("No of projects = ", len(prj_map))
+    print("No of projects = ", len(info.prj_map))
     wc3 = wordcloud.WordCloud(background_color="white", width=1920, height=1280)
-    wc3.fit_words(prj_map)
+    wc3.fit_words(info.prj_map)
     wc3.to_file("floss_projects.png")
 
 # Pie chart
 if args.funding_pie:
-    labels = cur_fr.keys()
-    sizes = cur_fr.values()
+    import matplotlib.pyplot as plt
+
+    labels = info.cur_fr.keys()
+    sizes = info.cur_fr.values()
     explode = [
         0.1 if currency == "USD" else 0 for currency in labels
     ]  # only "explode" USD
@@ -232,13 +445,19 @@ if args.funding_pie:
 
 # Bar + line plot
 if args.funding_trend:
+    import matplotlib.pyplot as plt
+    import pandas as pd
+
+    trend_ts = timeseries if trend is None else trend
     p1_t = pd.DataFrame(
         {
-            "d_manifests": timeseries["d_manifests"],
-            "d_projects": timeseries["d_projects"],
-            "c_mfr_total_clipped": timeseries["c_mfr_total_clipped"],
+            "d_manifests": trend_ts["d_manifests"],
+            "d_projects": trend_ts["d_projects"],
+            "c_mfr_total_clipped": trend_ts["c_mfr_total_clipped"],
         }
     )
+    if trend is not None:
+        p1_t.index = [str(start) for start in trend["start"]]
 
     # p1_t[['d_manifests', 'd_projects']].plot(kind='bar')
     p1_t[["d_manifests"]].plot(kind="bar")
@@ -247,14 +466,15 @@ if args.funding_trend:
 
 # Bar plot
 if args.funding_bar:
-    fund_sum = 0
-    for idx, val in enumerate(ety_clipped_funding):
-        percentage = math.floor((fund_sum / ety_clipped_sum) * 100)
-        print(idx, val, 100 - percentage)
-        fund_sum += val
-    print(ety_clipped_sum)
+    import matplotlib.pyplot as plt
+
+    for line in info.table.funding_bins().report():
+        print(line)
+    for line in info.table.funding_bins(by="etype").report():
+        print(line)
+    print(info.ety_clipped_sum)
     # Area plot
-    y = ety_clipped_funding
+    y = info.ety_clipped_funding
     x = range(len(y))
-    plt.bar(x, y, color=ety_clipped_colors)
+    plt.bar(x, y, color=info.ety_clipped_colors)
     plt.show()
@@ -0,0 +1,374 @@
+#
+# manifest_db
+#
+# History of the funding manifest dump, in sqlite.
+#
+# mdb_history keeps every snapshot (the tar.gz) as is. That grows by
+# the full size of the dump every day, even though only a handful of
+# manifests change from one day to the next.
+#
+# The dedup store splits the CSV in a snapshot into its records
+# (header, and one per manifest), and keeps every distinct record
+# once, keyed by its hash. A snapshot is then just the list of its
+# records' hashes. Records are kept as raw bytes, so a snapshot's
+# CSV can be written out byte for byte.
+#
+# mdb_history also gets a digest (md5) and size of every snapshot,
+# computed once, so listing the history needn't read any BLOBs.
+#
+# Schema:
+#
+#   mdb_history(fetched_at, url, last_modified, data, md5, size)
+#   mdb_snapshot(id, fetched_at, url, last_modified, nrecords)
+#   mdb_record(hash, data)           -- sha256 of data => CSV record
+#   mdb_member(snapshot, position, hash)
+#   mdb_summary(last_modified, manifests, ..., details)
+#
+# mdb_summary has the headline numbers from process_csv for every
+# snapshot. summarize_history() fills it in, one snapshot per worker
+# process.
+#
+import concurrent.futures
+import contextlib
+import hashlib
+import io
+import json
+import math
+import sqlite3
+import tempfile
+import fetch
+import sqlite3_adapters
+import stats
+
+# BLOBs are read/written in pieces of this size, so memory use
+# doesn't depend on the size of the dump
+chunk_size = 1024 * 1024
+
+
+def iter_blob(conn, table, column, rowid):
+    """Contents of a BLOB, in chunks"""
+    with conn.blobopen(table, column, rowid, readonly=True) as blob:
+        while chunk := blob.read(chunk_size):
+            yield chunk
+
+
+def insert_history(conn, fetched_at, url, last_modified, chunks):
+    """Insert a snapshot (tar.gz, given as an iterable of bytes) into
+    mdb_history. Returns (md5, size). The caller commits.
+    """
+    # The BLOB is preallocated with zeroblob(), so we need the size
+    # up front. Spool to a temporary file to find it.
+    md5 = hashlib.md5()
+    size = 0
+    with tempfile.TemporaryFile() as tmp:
+        for chunk in chunks:
+            md5.update(chunk)
+            size += len(chunk)
+            tmp.write(chunk)
+        cursor = conn.execute(
+            "INSERT INTO mdb_history(fetched_at, url, last_modified, data, md5, size)"
+            " VALUES(?, ?, ?, zeroblob(?), ?, ?)",
+            (fetched_at, url, last_modified, size, md5.hexdigest(), size),
+        )
+        tmp.seek(0)
+        with conn.blobopen("mdb_history", "data", cursor.lastrowid) as blob:
+            while chunk := tmp.read(chunk_size):
+                blob.write(chunk)
+    return md5.hexdigest(), size
+
+
+def latest_snapshot(conn, store="blob"):
+    """(last_modified, size) of the newest snapshot in store, blob or
+    dedup. (None, None) if there isn't one. size of dedup snapshots is
+    not known (None).
+    """
+    if store == "dedup":
+        init_dedup(conn)
+        qr = conn.execute(
+            "SELECT last_modified, NULL FROM mdb_snapshot"
+            " ORDER BY last_modified DESC LIMIT 1"
+        )
+    else:
+        qr = conn.execute(
+            "SELECT last_modified, size FROM mdb_history"
+            " ORDER BY last_modified DESC LIMIT 1"
+        )
+    return qr.fetchone() or (None, None)
+
+
+def export_history(conn, rowid, fp):
+    """Write the snapshot (tar.gz) in mdb_history row rowid to fp"""
+    for chunk in iter_blob(conn, "mdb_history", "data", rowid):
+        fp.write(chunk)
+
+
+def init_history(conn):
+    """Add md5/size columns and an index to mdb_history if needed.
+
+    Fills in md5/size of records that don't have them yet.
+    Returns the number of records updated.
+    """
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(mdb_history)")]
+    if "md5" not in columns:
+        conn.execute("ALTER TABLE mdb_history ADD COLUMN md5 TEXT")
+    if "size" not in columns:
+        conn.execute("ALTER TABLE mdb_history ADD COLUMN size INTEGER")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS mdb_history_last_modified"
+        " ON mdb_history(last_modified)"
+    )
+    todo = conn.execute(
+        "SELECT rowid FROM mdb_history WHERE md5 IS NULL OR size IS NULL"
+    ).fetchall()
+    for (rowid,) in todo:
+        md5 = hashlib.md5()
+        size = 0
+        for chunk in iter_blob(conn, "mdb_history", "data", rowid):
+            md5.update(chunk)
+            size += len(chunk)
+        conn.execute(
+            "UPDATE mdb_history SET md5 = ?, size = ? WHERE rowid = ?",
+            (md5.hexdigest(), size, rowid),
+        )
+    conn.commit()
+    return len(todo)
+
+
+def init_dedup(conn):
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS mdb_snapshot(
+            id INTEGER PRIMARY KEY,
+            fetched_at DATETIME,
+            url TEXT,
+            last_modified DATETIME UNIQUE,
+            nrecords INTEGER);
+        CREATE TABLE IF NOT EXISTS mdb_record(
+            hash BLOB PRIMARY KEY,
+            data BLOB) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS mdb_member(
+            snapshot INTEGER,
+            position INTEGER,
+            hash BLOB,
+            PRIMARY KEY(snapshot, position)) WITHOUT ROWID;
+        """
+    )
+
+
+def has_snapshot(conn, last_modified):
+    qr = conn.execute(
+        "SELECT 1 FROM mdb_snapshot WHERE last_modified = ?", (last_modified,)
+    )
+    return qr.fetchone() is not None
+
+
+def store_dedup(conn, fetched_at, url, last_modified, csvfile):
+    """Store the CSV in binary file csvfile as a snapshot.
+
+    Returns (records in snapshot, records that were new). The
+    caller commits.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT INTO mdb_snapshot(fetched_at, url, last_modified) VALUES(?, ?, ?)",
+        (fetched_at, url, last_modified),
+    )
+    snapshot = cursor.lastrowid
+    nrecords = 0
+    added = 0
+    for position, record in enumerate(stats.iter_csv_records(csvfile)):
+        digest = hashlib.sha256(record).digest()
+        cursor.execute(
+            "INSERT OR IGNORE INTO mdb_record VALUES(?, ?)", (digest, record)
+        )
+        added += cursor.rowcount
+        cursor.execute(
+            "INSERT INTO mdb_member VALUES(?, ?, ?)", (snapshot, position, digest)
+        )
+        nrecords += 1
+    cursor.execute(
+        "UPDATE mdb_snapshot SET nrecords = ? WHERE id = ?", (nrecords, snapshot)
+    )
+    cursor.close()
+    return nrecords, added
+
+
+def dedup_history(conn):
+    """Add every snapshot in mdb_history to the dedup store.
+
+    Snapshots that are already there are skipped. Yields
+    (last_modified, records, new records) for the ones added.
+    """
+    init_dedup(conn)
+    qr = conn.execute(
+        "SELECT last_modified FROM mdb_history ORDER BY last_modified ASC"
+    )
+    for (last_modified,) in qr.fetchall():
+        if has_snapshot(conn, last_modified):
+            continue
+        rowid, fetched_at, url = conn.execute(
+            "SELECT rowid, fetched_at, url FROM mdb_history WHERE last_modified = ?",
+            (last_modified,),
+        ).fetchone()
+        with conn.blobopen("mdb_history", "data", rowid, readonly=True) as blob:
+            with fetch.open_csv_stream(blob, text=False) as csvfile:
+                nrecords, added = store_dedup(
+                    conn, fetched_at, url, last_modified, csvfile
+                )
+        conn.commit()
+        yield last_modified, nrecords, added
+
+
+def snapshots(conn):
+    """(id, last_modified, fetched_at, url, nrecords) of stored snapshots,
+    oldest first"""
+    init_dedup(conn)
+    qr = conn.execute(
+        "SELECT id, last_modified, fetched_at, url, nrecords FROM mdb_snapshot"
+        " ORDER BY last_modified ASC"
+    )
+    return qr.fetchall()
+
+
+def iter_snapshot_records(conn, snapshot):
+    """Raw CSV records of a snapshot, in order"""
+    qr = conn.execute(
+        "SELECT r.data FROM mdb_member m JOIN mdb_record r ON m.hash = r.hash"
+        " WHERE m.snapshot = ? ORDER BY m.position",
+        (snapshot,),
+    )
+    for (record,) in qr:
+        yield record
+
+
+def export_csv(conn, snapshot, fp):
+    """Write the CSV of a snapshot to binary file fp"""
+    for record in iter_snapshot_records(conn, snapshot):
+        fp.write(record)
+
+
+def snapshot_keys(conn, store="blob"):
+    """(key, last_modified) of every snapshot in store, oldest first.
+    key is what open_snapshot() takes."""
+    if store == "dedup":
+        return [(row[0], row[1]) for row in snapshots(conn)]
+    qr = conn.execute(
+        "SELECT rowid, last_modified FROM mdb_history ORDER BY last_modified ASC"
+    )
+    return qr.fetchall()
+
+
+@contextlib.contextmanager
+def open_snapshot(conn, store, key):
+    """The CSV of a snapshot, as text lines for csv.reader"""
+    if store == "dedup":
+        records = iter_snapshot_records(conn, key)
+        yield (record.decode("utf-8") for record in records)
+        return
+    with conn.blobopen("mdb_history", "data", key, readonly=True) as blob:
+        with fetch.open_csv_stream(blob) as csvfile:
+            yield csvfile
+
+
+def iter_snapshots(conn, store="blob"):
+    """Yield (last_modified, csvfile) for every snapshot in store (blob
+    or dedup), oldest first. csvfile is valid until the next snapshot
+    is yielded.
+    """
+    for key, last_modified in snapshot_keys(conn, store):
+        with open_snapshot(conn, store, key) as csvfile:
+            yield last_modified, csvfile
+
+
+# Per snapshot results of process_csv. The headline numbers get
+# columns; details is JSON with the breakdowns.
+def init_summary(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS mdb_summary(
+            last_modified DATETIME PRIMARY KEY,
+            manifests INTEGER,
+            active INTEGER,
+            disabled INTEGER,
+            errors INTEGER,
+            meets_ft INTEGER,
+            zero_fr INTEGER,
+            projects INTEGER,
+            funding_requested INTEGER,
+            funding_requested_clipped INTEGER,
+            details TEXT)
+        """
+    )
+
+
+def snapshot_summary(info, timeseries):
+    details = {
+        "etype_count": info.etype_count,
+        "etype_meets_ft": info.etype_meets_ft,
+        "erole_count": info.erole_count,
+        "cur_fr": info.cur_fr,
+        "used_currencies": info.used_currencies,
+        "lic_map": info.lic_map,
+        "annual_fin_totals": info.annual_fin_totals,
+        "fin_totals": info.fin_totals,
+        "tag_count": info.tag_count,
+    }
+    return (
+        info.nr,
+        len(info.mdesc),
+        info.disabled,
+        info.errors,
+        info.meets_ft,
+        info.manifests_zfr,
+        sum(info.etype_proj_count.values()),
+        math.floor(info.ety_clipped_sum),
+        # Over all manifests - the timeseries leaves out the newest one
+        math.floor(
+            sum(min(max(fr, stats.ft), stats.fmax) for fr in info.table.max_fr.tolist())
+        ),
+        json.dumps(details),
+    )
+
+
+def summarize_snapshot(db_path, store, key):
+    # Runs in a worker process, with its own read-only connection
+    sqlite3_adapters.register_datetime()
+    conn = sqlite3.connect(
+        f"file:{db_path}?mode=ro", uri=True, detect_types=sqlite3.PARSE_DECLTYPES
+    )
+    try:
+        with open_snapshot(conn, store, key) as csvfile:
+            # process_csv chats about disabled/broken manifests
+            with contextlib.redirect_stdout(io.StringIO()):
+                info, timeseries = stats.process_csv(csvfile)
+    finally:
+        conn.close()
+    return snapshot_summary(info, timeseries)
+
+
+def summarize_history(conn, db_path, store="blob", workers=None):
+    """Compute summaries of snapshots in store that don't have one
+    yet, in a pool of workers processes. Yields the last_modified of
+    every snapshot as its summary is stored.
+    """
+    init_summary(conn)
+    conn.commit()
+    done = {row[0] for row in conn.execute("SELECT last_modified FROM mdb_summary")}
+    todo = [
+        (key, last_modified)
+        for key, last_modified in snapshot_keys(conn, store)
+        if last_modified not in done
+    ]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        jobs = {
+            pool.submit(summarize_snapshot, db_path, store, key): last_modified
+            for key, last_modified in todo
+        }
+        for job in concurrent.futures.as_completed(jobs):
+            last_modified = jobs[job]
+            conn.execute(
+                "INSERT INTO mdb_summary VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (last_modified, *job.result()),
+            )
+            conn.commit()
+            yield last_modified
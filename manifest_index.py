@@ -0,0 +1,187 @@
+#
+# manifest_index
+#
+# Find single manifests in funding-manifests.csv, without going
+# through all of it.
+#
+# The CSV is memory-mapped. On first use, one pass over it notes
+# where every record starts and how long it is, by row id, url and
+# entity name. That index is saved next to the CSV (<csv>.idx), and
+# rebuilt when the CSV's size or modification time changes. A lookup
+# is then a dict access, and decoding one record straight out of the
+# mapping.
+#
+# The index is plain JSON. Anyone can drop a file next to the CSV, so
+# it's only ever decoded as data; if it doesn't read as an index of
+# the right shape, it's rebuilt.
+#
+import csv
+import io
+import json
+import mmap
+import os
+import stats
+
+# Bump this when the saved index changes shape
+index_version = 2
+
+
+def csv_row(text):
+    return next(csv.reader(io.StringIO(text, newline="")), [])
+
+
+def scan(mm):
+    """Index records in the mapped CSV. Returns (ids, urls, enames):
+    id => (offset, length), url => (offset, length), and entity name
+    => list of (offset, length)"""
+    ids = {}
+    urls = {}
+    enames = {}
+    offset = 0
+    mm.seek(0)
+    records = stats.iter_csv_records(iter(mm.readline, b""))
+    for idx, record in enumerate(records):
+        position = (offset, len(record))
+        offset += len(record)
+        # Skip the header and the localhost test line
+        if idx < 2:
+            continue
+        try:
+            row = csv_row(record.decode("utf-8"))
+        except (UnicodeDecodeError, csv.Error):
+            continue
+        # Not a manifest row (a stray line, or a cut off file)
+        if len(row) < 6:
+            continue
+        rid, url, created_at, updated_at, status, manifest_json = row[:6]
+        ids[rid] = position
+        urls[url] = position
+        try:
+            ename = json.loads(manifest_json)["entity"]["name"]
+        except (json.decoder.JSONDecodeError, KeyError, TypeError):
+            continue
+        if ename not in enames:
+            enames[ename] = []
+        enames[ename].append(position)
+    return ids, urls, enames
+
+
+def position(value, size):
+    # (offset, length) from JSON, or None if it's not one within size
+    if (
+        isinstance(value, list)
+        and len(value) == 2
+        and all(type(n) is int and n >= 0 for n in value)
+        and value[0] + value[1] <= size
+    ):
+        return tuple(value)
+    return None
+
+
+def positions(table, size, many=False):
+    # key => position (or list of them) from JSON, or None
+    if not isinstance(table, dict):
+        return None
+    result = {}
+    for key, value in table.items():
+        if many:
+            if not isinstance(value, list):
+                return None
+            value = [position(item, size) for item in value]
+            if None in value:
+                return None
+        else:
+            value = position(value, size)
+            if value is None:
+                return None
+        result[key] = value
+    return result
+
+
+def saved_index(saved, stamp):
+    """(ids, urls, enames) from a decoded index file, or None if it's
+    stale or not an index"""
+    if not isinstance(saved, dict) or saved.get("stamp") != list(stamp):
+        return None
+    size = stamp[1]
+    index = (
+        positions(saved.get("ids"), size),
+        positions(saved.get("urls"), size),
+        positions(saved.get("enames"), size, many=True),
+    )
+    return None if None in index else index
+
+
+class ManifestIndex:
+    """Rows of a funding-manifests.csv, by id, url or entity name.
+
+    Rows come back as lists of fields, like csv.reader gives them -
+    hand them to stats.derive_mdesc() for the rest.
+    """
+
+    def __init__(self, path, index_path=None):
+        self.index_path = index_path or f"{path}.idx"
+        self.fp = open(path, "rb")
+        st = os.fstat(self.fp.fileno())
+        # mmap can't map an empty file
+        self.mm = None
+        if st.st_size:
+            self.mm = mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ)
+        self.stamp = (index_version, st.st_size, st.st_mtime_ns)
+        self.ids, self.urls, self.enames = self.load()
+
+    def load(self):
+        try:
+            with open(self.index_path, "rb") as fp:
+                index = saved_index(json.load(fp), self.stamp)
+            if index is not None:
+                return index
+        except (OSError, ValueError):
+            # Missing, or not JSON
+            pass
+        if self.mm is None:
+            return {}, {}, {}
+        ids, urls, enames = scan(self.mm)
+        saved = {
+            "stamp": list(self.stamp),
+            "ids": ids,
+            "urls": urls,
+            "enames": enames,
+        }
+        try:
+            with open(self.index_path, "w", encoding="utf-8") as fp:
+                json.dump(saved, fp, separators=(",", ":"))
+        except OSError:
+            # Read-only directory? The index still works for this run.
+            pass
+        return ids, urls, enames
+
+    def row(self, position):
+        offset, length = position
+        # Decodes straight from the mapping, without copying the
+        # record to a bytes object first
+        with memoryview(self.mm) as view:
+            text = str(view[offset : offset + length], "utf-8")
+        return csv_row(text)
+
+    def by_id(self, rid):
+        position = self.ids.get(rid)
+        return None if position is None else self.row(position)
+
+    def by_url(self, url):
+        position = self.urls.get(url)
+        return None if position is None else self.row(position)
+
+    def by_name(self, ename):
+        return [self.row(position) for position in self.enames.get(ename, [])]
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+        self.fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
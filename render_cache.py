@@ -0,0 +1,72 @@
+#
+# render_cache
+#
+# Keep rendered charts (image bytes) per snapshot of the dump, so page
+# views don't redraw the same figures.
+#
+# Entries are keyed by (snapshot key, chart name). The cache is held
+# under a size cap, least recently used entries go first. When several
+# threads ask for a chart that isn't there yet, one of them renders it
+# and the others wait for that result.
+#
+import collections
+import concurrent.futures
+import threading
+
+default_max_bytes = 16 * 1024 * 1024
+
+
+class RenderCache:
+    """Rendered chart bytes, by key, at most max_bytes of them"""
+
+    def __init__(self, max_bytes=default_max_bytes):
+        self.max_bytes = max_bytes
+        self.images = collections.OrderedDict()
+        self.size = 0
+        self.pending = {}  # key => Future, while it's being rendered
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, render):
+        """Bytes for key, from render() if not cached. With key None,
+        just render."""
+        if key is None:
+            return render()
+        with self.lock:
+            if key in self.images:
+                self.hits += 1
+                self.images.move_to_end(key)
+                return self.images[key]
+            future = self.pending.get(key)
+            owner = future is None
+            if owner:
+                self.misses += 1
+                future = self.pending[key] = concurrent.futures.Future()
+            else:
+                self.hits += 1
+        if not owner:
+            return future.result()
+
+        try:
+            image = render()
+        except BaseException as exc:
+            with self.lock:
+                del self.pending[key]
+            future.set_exception(exc)
+            raise
+        with self.lock:
+            del self.pending[key]
+            self.store(key, image)
+        future.set_result(image)
+        return image
+
+    def store(self, key, image):
+        # Called with self.lock held
+        if len(image) > self.max_bytes:
+            return
+        self.images[key] = image
+        self.size += len(image)
+        while self.size > self.max_bytes:
+            key, old = self.images.popitem(last=False)
+            self.size -= len(old)
@@ -0,0 +1,89 @@
+#
+# results_cache
+#
+# Remember what process_csv() computed for a CSV file, so looking at
+# the same dump again doesn't parse it again.
+#
+# Results are pickled to <cache dir>/<key>.pickle. The key is a hash
+# of the CSV content, and of everything process_csv() output depends
+# on: stats.py itself and project-tags.txt. Editing either makes old
+# entries unreachable; they age out like any other.
+#
+# The cache directory is kept under a size cap. Reading an entry
+# touches its mtime, and the least recently used entries are removed
+# first.
+#
+import gc
+import hashlib
+import os
+import pickle
+import tempfile
+import stats
+
+default_dir = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "fm-stats"
+)
+default_max_bytes = 256 * 1024 * 1024
+
+
+def code_stamp():
+    h = hashlib.sha256()
+    for path in [stats.__file__, "project-tags.txt"]:
+        with open(path, "rb") as fp:
+            h.update(hashlib.file_digest(fp, "sha256").digest())
+    return h.hexdigest()
+
+
+def cache_key(csv_path):
+    h = hashlib.sha256(code_stamp().encode("ascii"))
+    with open(csv_path, "rb") as fp:
+        h.update(hashlib.file_digest(fp, "sha256").digest())
+    return h.hexdigest()
+
+
+def load(key, cache_dir=default_dir):
+    """(info, timeseries) stored under key, or None"""
+    path = os.path.join(cache_dir, f"{key}.pickle")
+    # Results are lots of small dicts. Cyclic GC passes triggered
+    # while they are created more than double the load time.
+    gc.disable()
+    try:
+        with open(path, "rb") as fp:
+            result = pickle.load(fp)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        # Truncated, or written by an incompatible version
+        os.unlink(path)
+        return None
+    finally:
+        gc.enable()
+    os.utime(path)
+    return result
+
+
+def store(key, result, cache_dir=default_dir, max_bytes=default_max_bytes):
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write to a temporary file first, so readers never see half an entry
+    with tempfile.NamedTemporaryFile(
+        dir=cache_dir, suffix=".tmp", delete=False
+    ) as fp:
+        pickle.dump(result, fp, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(fp.name, os.path.join(cache_dir, f"{key}.pickle"))
+    evict(cache_dir, max_bytes)
+
+
+def evict(cache_dir=default_dir, max_bytes=default_max_bytes):
+    """Remove least recently used entries until the total size is
+    max_bytes or less"""
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith(".pickle"):
+            st = entry.stat()
+            entries.append((st.st_mtime, st.st_size, entry.path))
+    total = sum(size for mtime, size, path in entries)
+    for mtime, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        os.unlink(path)
+        total -= size
@@ -9,19 +9,23 @@
 # in code. Everything is returned from process_csv
 #
 
+import concurrent.futures
+import contextlib
 import csv
 import datetime
-import dateutil.parser
-import time
+import functools
+import gc
+import hashlib
+import io
+import itertools
 import json
-from pprint import pprint
+import pickle
 import math
-import argparse
-import copy
-import string
-from PIL import Image
+import os
+import re
+import time
+import tracemalloc
 import numpy as np
-import statistics
 
 # FLOSS fund is looking to fund entities in the range
 # 10k - 100k.
@@ -97,152 +101,900 @@ lic_eq_map = {
 }
 
 
+# Everything process_csv computes. Plain attributes, set by the
+# finish() of each Aggregator
+class Info:
+    pass
+
+
+class Profile:
+    """Where process_csv(profile=...) spends its time.
+
+    phases maps a phase name to {"calls", "wall", "cpu", "alloc"}, in
+    the order phases first ran. Sub-phases have dotted names
+    ("derive.json"). wall and cpu are seconds. alloc is the change in
+    memory traced by tracemalloc, in bytes; it's only measured with
+    memory=True, which traces allocations while profiling (and makes
+    everything slower). counters counts rows: parsed, disabled, ...
+
+    Phases can be marked with the phase() context manager, or with
+    start()/stop() for code that doesn't nest well. Work that is
+    pulled from an iterator, like reading rows, is timed with timed().
+    """
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.phases = {}
+        self.counters = {}
+        self.running = {}
+
+    def start(self, name):
+        # Phases are listed in the order they start, parents first
+        self.add(name, 0, 0.0, 0.0, 0)
+        alloc = tracemalloc.get_traced_memory()[0] if self.memory else 0
+        self.running[name] = (time.perf_counter(), time.process_time(), alloc)
+
+    def stop(self, name):
+        wall, cpu, alloc = self.running.pop(name)
+        if self.memory:
+            alloc = tracemalloc.get_traced_memory()[0] - alloc
+        self.add(
+            name, 1, time.perf_counter() - wall, time.process_time() - cpu, alloc
+        )
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop(name)
+
+    def timed(self, iterable, name, within=None):
+        """Iterate over iterable, timing the next() calls as phase name.
+
+        Items are still pulled one by one. The time is counted as one
+        call, once the iterator is done. That time is also part of
+        whatever phase pulls the items; it's taken out of phase within.
+        """
+        self.add(name, 0, 0.0, 0.0, 0)
+        return self._timed(iter(iterable), name, within)
+
+    def _timed(self, it, name, within):
+        wall = 0.0
+        cpu = 0.0
+        try:
+            while True:
+                start = (time.perf_counter(), time.process_time())
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+                finally:
+                    wall += time.perf_counter() - start[0]
+                    cpu += time.process_time() - start[1]
+                yield item
+        finally:
+            self.add(name, 1, wall, cpu, 0)
+            if within is not None:
+                self.add(within, 0, -wall, -cpu, 0)
+
+    @contextlib.contextmanager
+    def tracing(self):
+        # Trace allocations for the duration, if asked to
+        started = self.memory and not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        try:
+            yield
+        finally:
+            if started:
+                tracemalloc.stop()
+
+    def add(self, name, calls, wall, cpu, alloc):
+        if name not in self.phases:
+            self.phases[name] = {"calls": 0, "wall": 0.0, "cpu": 0.0, "alloc": 0}
+        record = self.phases[name]
+        record["calls"] += calls
+        record["wall"] += wall
+        record["cpu"] += cpu
+        record["alloc"] += alloc
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def merge(self, other):
+        # Add up what other (e.g. a worker process) measured
+        for name, record in other.phases.items():
+            self.add(name, *record.values())
+        for name, n in other.counters.items():
+            self.count(name, n)
+
+    def ordered(self):
+        # Phase names, each followed by its sub-phases. Sub-phases can
+        # start after a sibling of their parent (timed() phases run
+        # inside the phase that pulls from them).
+        def parent(name):
+            up = name.rpartition(".")[0]
+            return up if up in self.phases else ""
+
+        children = {}
+        for name in self.phases:
+            children.setdefault(parent(name), []).append(name)
+
+        def walk(up):
+            for name in children.get(up, []):
+                yield name
+                yield from walk(name)
+
+        return list(walk(""))
+
+    def report(self):
+        """Lines of text, for printing"""
+        lines = [f"{'phase':28s} {'calls':>8s} {'wall s':>9s} {'cpu s':>9s}"]
+        if self.memory:
+            lines[0] += f" {'alloc MB':>9s}"
+        for name in self.ordered():
+            record = self.phases[name]
+            depth = name.count(".")
+            label = "  " * depth + name.rsplit(".", 1)[-1]
+            line = (
+                f"{label:28s} {record['calls']:8d} "
+                f"{record['wall']:9.3f} {record['cpu']:9.3f}"
+            )
+            if self.memory:
+                line += f" {record['alloc'] / 2**20:9.1f}"
+            lines.append(line)
+        for name, n in self.counters.items():
+            lines.append(f"{name:28s} {n:8d}")
+        return lines
+
+
+# Stands in for a Profile when not profiling
+class _NoPhase:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        return False
+
+
+_no_phase = _NoPhase()
+
+
+def _phase(profile, name):
+    if profile is None:
+        return _no_phase
+    return profile.phase(name)
+
+
+epoch = datetime.datetime(1970, 1, 1, tzinfo=datetime.UTC)
+usec = datetime.timedelta(microseconds=1)
+
+
+# Funding request ranges shown by the front-ends: below the threshold,
+# then 10k steps up to the maximum
+fr_edges = [0, ft] + list(range(ft + 10 * 1000, fmax + 1, 10 * 1000))
+
+
+def log_edges(lo, hi, count):
+    """count log spaced bins from lo to hi (lo > 0)"""
+    return np.geomspace(lo, hi, count + 1)
+
+
+def fr_label(lo, hi):
+    def k(val):
+        if val >= 1e6:
+            return f"{val / 1e6:.3g}M"
+        return f"{val / 1000:.3g}k" if val else "0"
+
+    if not lo:
+        return f"< {k(hi)} USD"
+    return f"{k(lo)} - {k(hi)} USD"
+
+
+class FundingBins:
+    """Funding requested, binned. See bin_funding().
+
+      edges     bin edges, nbins + 1 of them
+      groups    group names, or None if not broken down
+      counts    int64, manifests per bin
+      sums      float64, funding requested per bin
+
+    counts and sums are shaped (nbins,), or (len(groups), nbins) when
+    broken down. Cumulative shares run over the bins of each group,
+    from 0 to 1.
+    """
+
+    def __init__(self, edges, groups, counts, sums):
+        self.edges = edges
+        self.groups = groups
+        self.counts = counts
+        self.sums = sums
+
+    def labels(self):
+        return [fr_label(lo, hi) for lo, hi in zip(self.edges[:-1], self.edges[1:])]
+
+    @staticmethod
+    def _cumulative_share(values):
+        cum = np.cumsum(values, axis=-1, dtype=np.float64)
+        total = cum[..., -1:]
+        return np.divide(cum, total, out=np.zeros_like(cum), where=total > 0)
+
+    @property
+    def cum_count_share(self):
+        return self._cumulative_share(self.counts)
+
+    @property
+    def cum_sum_share(self):
+        return self._cumulative_share(self.sums)
+
+    def report(self):
+        """Lines of text, for printing. Broken down results only show
+        counts, a column per group."""
+        labels = self.labels()
+        if self.groups is not None:
+            lines = [f"{'range':18s}" + "".join(f" {g:>12s}" for g in self.groups)]
+            for idx, label in enumerate(labels):
+                counts = "".join(f" {n:12d}" for n in self.counts[:, idx])
+                lines.append(f"{label:18s}{counts}")
+            return lines
+        lines = [
+            f"{'range':18s} {'count':>8s} {'USD':>14s} {'cum %':>7s} {'cum USD %':>9s}"
+        ]
+        for label, n, usd, count_share, sum_share in zip(
+            labels, self.counts, self.sums, self.cum_count_share, self.cum_sum_share
+        ):
+            lines.append(
+                f"{label:18s} {n:8d} {usd:14.0f} "
+                f"{count_share * 100:7.1f} {sum_share * 100:9.1f}"
+            )
+        return lines
+
+
+def bin_funding(values, edges, codes=None, groups=None, clip=False):
+    """Bin funding requests (USD) in one pass.
+
+    Bins are [edges[i], edges[i + 1]), the last one closed, like
+    np.histogram. Values outside the edges aren't counted, unless clip
+    is set: then they are clipped into the first/last bin, and summed
+    at the clipped value.
+
+    To break the result down, pass codes (an int array, one per value)
+    into groups (the group names) - e.g. ManifestTable.etype and
+    ManifestTable.etypes.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    edges = np.asarray(edges, dtype=np.float64)
+    nbins = len(edges) - 1
+    if clip:
+        values = np.clip(values, edges[0], edges[-1])
+    idx = np.searchsorted(edges, values, side="right") - 1
+    # Close the last bin
+    idx[values == edges[-1]] = nbins - 1
+    keep = (idx >= 0) & (idx < nbins)
+    ngroups = 1
+    if codes is not None:
+        ngroups = len(groups)
+        idx = idx + np.asarray(codes, dtype=np.int64) * nbins
+    idx = idx[keep]
+    counts = np.bincount(idx, minlength=ngroups * nbins)
+    sums = np.bincount(idx, weights=values[keep], minlength=ngroups * nbins)
+    if codes is None:
+        return FundingBins(edges, None, counts, sums)
+    shape = (ngroups, nbins)
+    return FundingBins(edges, groups, counts.reshape(shape), sums.reshape(shape))
+
+
+def categorize(values):
+    """Return (codes, categories) for a list of strings.
+
+    categories are in order of first appearance.
+    """
+    lookup = {}
+    codes = np.fromiter(
+        (lookup.setdefault(val, len(lookup)) for val in values),
+        dtype=np.int32,
+        count=len(values),
+    )
+    return codes, np.array(list(lookup.keys()), dtype=object)
+
+
+class ManifestTable:
+    """Columnar view of (active) manifests.
+
+    One NumPy array per field, one entry per manifest:
+
+      id                   int64 (manifest id)
+      created_at           int64 (microseconds since epoch, UTC)
+      updated_at           int64 (same)
+      max_fr               float64 (max funding requested, USD)
+      fin_totals           int64, shape (n, 3) - columns as ft_keys
+      nprojects            int32
+      nfl                  int32 (non-free licences)
+      etype, erole, ename  int32 codes into etypes, eroles, enames
+      currency             int32 codes (primary currency) into currencies
+      currency_set         int64 bitmask of all currencies, bits as in
+                           currency_bits
+
+    Sorting/filtering works on the arrays. For code that wants the
+    per manifest records, table[i] and table.take(indices) return
+    those - unless records is None (see ManifestColumns).
+    """
+
+    # Coded columns, and their categories
+    categories = {
+        "etype": "etypes",
+        "erole": "eroles",
+        "ename": "enames",
+        "currency": "currencies",
+    }
+
+    def __init__(self, mdesc):
+        n = len(mdesc)
+        self.records = mdesc
+        try:
+            self.id = np.fromiter((int(m["id"]) for m in mdesc), np.int64, n)
+        except ValueError:
+            self.id = np.array([m["id"] for m in mdesc], dtype=object)
+        self.created_at = np.fromiter(
+            ((m["created_at"] - epoch) // usec for m in mdesc), np.int64, n
+        )
+        self.updated_at = np.fromiter(
+            ((m["updated_at"] - epoch) // usec for m in mdesc), np.int64, n
+        )
+        self.max_fr = np.fromiter(
+            (m["funding-plan-max"]["max-fr"] for m in mdesc), np.float64, n
+        )
+        self.fin_totals = np.array(
+            [[m["fin_totals"][key] for key in ft_keys] for m in mdesc],
+            dtype=np.int64,
+        ).reshape(n, len(ft_keys))
+        self.nprojects = np.fromiter(
+            (len(m.project_names) for m in mdesc), np.int32, n
+        )
+        self.nfl = np.fromiter((m.nfl for m in mdesc), np.int32, n)
+        self.etype, self.etypes = categorize([m.etype for m in mdesc])
+        self.erole, self.eroles = categorize([m.erole for m in mdesc])
+        self.ename, self.enames = categorize([m.ename for m in mdesc])
+        self.currency, self.currencies = categorize(
+            [m["currencies"][0] for m in mdesc]
+        )
+        # All currencies (plans and history) of a manifest, one bit per
+        # currency in currency_bits
+        used = [
+            set(m["currencies"]) | {hist["currency"] for hist in m["fin_history"]}
+            for m in mdesc
+        ]
+        self.currency_bits = sorted(set().union(*used))
+        bit = {currency: 1 << idx for idx, currency in enumerate(self.currency_bits)}
+        self.currency_set = np.fromiter(
+            (sum(bit[currency] for currency in cset) for cset in used), np.int64, n
+        )
+
+    @classmethod
+    def concat(cls, tables):
+        """One table with the manifests of tables, in order. Codes and
+        currency bits are made up again, as if the table had been
+        built from all the records at once."""
+        table = cls.__new__(cls)
+        records = [part.records for part in tables]
+        table.records = None
+        if all(part is not None for part in records):
+            table.records = list(itertools.chain.from_iterable(records))
+        for column in [
+            "id",
+            "created_at",
+            "updated_at",
+            "max_fr",
+            "fin_totals",
+            "nprojects",
+            "nfl",
+        ]:
+            values = [getattr(part, column) for part in tables]
+            setattr(table, column, np.concatenate(values))
+        for column, names in cls.categories.items():
+            lookup = {}
+            codes = []
+            for part in tables:
+                seen = getattr(part, names)
+                remap = [lookup.setdefault(val, len(lookup)) for val in seen]
+                remap = np.array(remap, dtype=np.int32)
+                codes.append(remap[getattr(part, column)])
+            setattr(table, column, np.concatenate(codes))
+            setattr(table, names, np.array(list(lookup.keys()), dtype=object))
+        table.currency_bits = sorted(
+            set().union(*(part.currency_bits for part in tables))
+        )
+        currency_set = []
+        for part in tables:
+            cset = np.zeros(len(part.currency_set), dtype=np.int64)
+            for bit, currency in enumerate(part.currency_bits):
+                new_bit = table.currency_bits.index(currency)
+                cset |= ((part.currency_set >> bit) & 1) << new_bit
+            currency_set.append(cset)
+        table.currency_set = np.concatenate(currency_set)
+        return table
+
+    def __len__(self):
+        return len(self.id)
+
+    def __getitem__(self, idx):
+        return self.records[idx]
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def order(self, column, reverse=False):
+        """Indices that sort by column. Stable, like list.sort()"""
+        values = getattr(self, column)
+        if reverse:
+            values = -values
+        return np.argsort(values, kind="stable")
+
+    def take(self, indices):
+        """Per manifest records at indices"""
+        return [self.records[idx] for idx in indices]
+
+    def funding_bins(self, edges=fr_edges, by=None, requested_only=True, clip=True):
+        """bin_funding() of max_fr, optionally broken down by a coded
+        column ("etype", "erole", "currency"). By default, manifests
+        asking for nothing are left out, and requests over the last
+        edge are counted in the last bin."""
+        values = self.max_fr
+        codes = None if by is None else getattr(self, by)
+        if requested_only:
+            asked = values > 0
+            values = values[asked]
+            if codes is not None:
+                codes = codes[asked]
+        groups = None if by is None else getattr(self, self.categories[by])
+        return bin_funding(values, edges, codes, groups, clip)
+
+
+# FLOSS fund was launched on 15th October 2024, nominally
+# 10 AM IST => UTC + 5:30.
+launch_dt = datetime.datetime(2024, 10, 15, 15, 30, tzinfo=datetime.UTC)
+day_usec = datetime.timedelta(days=1) // usec
+
 # d_ => daily
 # c_ => cumulative
-def reset_counters():
-    d_manifests = 0
-    d_projects = 0
-    d_etype = {"organisation": 0, "individual": 0, "group": 0}
-    d_manifests_above_ft = 0
-    d_fin_totals = {
+etype_keys = ["organisation", "individual", "group"]
+
+
+def zero_fin_totals():
+    return {
         "income": 0,
         "expenses": 0,
         "taxes": 0,
     }
-    d_mfr_total = 0
-    d_mfr_total_clipped = 0
-    d_currencies = []
-    return (
-        d_manifests,
-        d_projects,
-        d_etype,
-        d_fin_totals,
-        d_manifests_above_ft,
-        d_mfr_total,
-        d_mfr_total_clipped,
-        d_currencies,
-    )
 
 
-def process_csv(csvfile):
-    # FIXME ugliness in this script has to do with streamlit.
-    # it doesn't seem to delete globals. We'll clean this up
-    # in due time!
-    nr = 0
-    nad = 0
-    last_entity_dt = 0
-    disabled = 0
-    errors = 0
-    mdesc = []
-    disabled_mdesc = []
-    meets_ft = 0
-    manifests_zfr = 0  # zero fund requested !
-    etype_count = {}
-    etype_meets_ft = {}
-    erole_count = {}
-    etype_proj_count = {}
-    etype_max_fr = {}
-    lic_map = {}
-    annual_fin_totals = {}
-    used_currencies = []
-    cur_fr = {}
-    unused_tags = {}
-    tc_list = None
-    manifest_fin_count = {
-        "income": 0,
-        "expenses": 0,
-        "taxes": 0,
+def build_timeseries(table, by_created, profile=None):
+    """Compute, for every day since the launch of the FLOSS fund,
+
+    Additional
+      manifests, projects
+      entity types (org/individual/group)
+      manifests above funding threshold
+      funding requested (actual, and clipped to the fund's range)
+      financials, currencies
+    and their cumulative values.
+
+    by_created orders table by creation time. Returns
+    (timeseries, inaction_days, last_entity_dt, nad). Filling in the
+    trailing idle days is timed as "summarize.timeseries.gaps".
+    """
+    # Every manifest is binned by its day since launch (anything
+    # earlier counts as day 0). Each series is then one bincount/add.at
+    # over the bins, with room for every day preallocated - days
+    # without new manifests come out as zeros.
+    #
+    # FIXME the newest manifest isn't binned, and only shows up in
+    # c_fin_totals. That's how the per-day loop this replaced behaved,
+    # and the numbers on the live page are consistent with it.
+    counted = by_created[:-1]
+    launch_usec = (launch_dt - epoch) // usec
+    day = np.maximum((table.created_at[counted] - launch_usec) // day_usec, 0)
+    ndays = int(day.max()) + 1 if len(day) else 1
+
+    def daily_count(mask=None):
+        bins = day if mask is None else day[mask]
+        return np.bincount(bins, minlength=ndays)
+
+    def daily_sum(values):
+        total = np.zeros(ndays, dtype=values.dtype)
+        # Sequential in creation order, so float sums come out just
+        # like a running total would
+        np.add.at(total, day, values)
+        return total
+
+    def floor_cumsum(values):
+        # c = floor(c + d) every day
+        totals = itertools.accumulate(
+            values, lambda c, d: math.floor(c + d), initial=0
+        )
+        return list(totals)[1:]
+
+    max_fr = table.max_fr[counted]
+    d_mfr = daily_sum(max_fr).tolist()
+    d_mfr_clipped = daily_sum(np.clip(max_fr, ft, fmax)).tolist()
+    d_manifests = daily_count()
+    d_projects = daily_sum(table.nprojects[counted])
+    d_above_ft = daily_count(max_fr >= ft)
+    etype = table.etype[counted]
+    d_etype = {}
+    for key in etype_keys:
+        codes = np.flatnonzero(table.etypes == key)
+        code = codes[0] if len(codes) else -1
+        d_etype[key] = daily_count(etype == code)
+    c_etype = {key: np.cumsum(d_etype[key]).tolist() for key in etype_keys}
+    d_etype = {key: d_etype[key].tolist() for key in etype_keys}
+    fin_totals = table.fin_totals[counted]
+    d_fin = {
+        key: daily_sum(fin_totals[:, col]).tolist() for col, key in enumerate(ft_keys)
     }
-    # usage count for every tag used in projects
-    tag_count = {}
-    # multi-currency projects, an indicator of wider collaboration
-    mc_projects = []
-    # entity with the same name can submit multiple manifests.
-    # let's figure out who. It's a wide world, so names may match.
-    # Don't claim similarity, unless verified by other means
-    mdesc_by_ename = {}
-    # Map of project names to a "count"
-    # It's a wide world, so name clashes may happen. We'll use this
-    # to create a tag cloud
-    prj_map = {}
-    fin_totals = {
-        "income": 0,
-        "expenses": 0,
-        "taxes": 0,
+
+    # Currencies are sets, kept as bits in an int. Decode the days' masks
+    # into sorted lists
+    d_cmask = np.zeros(ndays, dtype=np.int64)
+    np.bitwise_or.at(d_cmask, day, table.currency_set[counted])
+    decoded = {}
+    d_currencies = []
+    c_currencies = []
+    for mask in d_cmask.tolist():
+        if mask not in decoded:
+            decoded[mask] = [
+                currency
+                for bit, currency in enumerate(table.currency_bits)
+                if mask & (1 << bit)
+            ]
+        d_currencies.append(list(decoded[mask]))
+        for currency in decoded[mask]:
+            if currency not in c_currencies:
+                c_currencies.append(currency)
+
+    # cumulative financials over all manifests
+    c_fin_totals = zero_fin_totals()
+    for col, key in enumerate(ft_keys):
+        c_fin_totals[key] += int(table.fin_totals[:, col].sum())
+
+    timeseries = {
+        "t": list(range(ndays)),  # day since launch
+        "d_manifests": d_manifests.tolist(),
+        "d_projects": d_projects.tolist(),
+        "d_mfr_total": [math.floor(x) for x in d_mfr],
+        "d_mfr_total_clipped": [math.floor(x) for x in d_mfr_clipped],
+        "d_etype": [dict(zip(etype_keys, x)) for x in zip(*d_etype.values())],
+        "d_manifests_above_ft": d_above_ft.tolist(),
+        "d_fin_totals": [dict(zip(ft_keys, x)) for x in zip(*d_fin.values())],
+        "d_currencies": d_currencies,
+        "c_manifests": np.cumsum(d_manifests).tolist(),
+        "c_projects": np.cumsum(d_projects).tolist(),
+        "c_mfr_total": floor_cumsum(d_mfr),
+        "c_mfr_total_clipped": floor_cumsum(d_mfr_clipped),
+        "c_etype": [dict(zip(etype_keys, x)) for x in zip(*c_etype.values())],
+        "c_manifests_above_ft": np.cumsum(d_above_ft).tolist(),
+        # These two are as of the latest data, on all days
+        "c_fin_totals": [c_fin_totals] * ndays,
+        "c_currencies": [c_currencies] * ndays,
     }
-    ety_clipped_funding = []
-    fr_below_ft = []
-    ety_clipped_sum = 0
-    inaction_days = 0
+    # Day 0 is always reported, whether or not entities joined
+    inaction_days = int(np.count_nonzero(d_manifests[1:] == 0))
 
-    reader = csv.reader(csvfile)
-    for idx, row in enumerate(reader):
-        # Skip the header and the localhost test line
-        if idx <= 1:
-            continue
+    last_entity_dt = launch_dt + datetime.timedelta(timeseries["t"][-1])
+    nad = datetime.datetime.now(datetime.UTC) - last_entity_dt
+    # Insert zeros at the end of the arrays - corresponding to
+    # trailing days that did not see any new entity joining
+    with _phase(profile, "summarize.timeseries.gaps"):
+        for idx in range(nad.days):
+            timeseries["t"].append(ndays - 1)
+            for key in timeseries:
+                if key.startswith("c_"):
+                    timeseries[key].append(timeseries[key][-1])
+            timeseries["d_manifests"].append(0)
+            timeseries["d_projects"].append(0)
+            timeseries["d_etype"].append({key: 0 for key in etype_keys})
+            timeseries["d_fin_totals"].append(zero_fin_totals())
+            timeseries["d_manifests_above_ft"].append(0)
+            timeseries["d_mfr_total"].append(0)
+            timeseries["d_mfr_total_clipped"].append(0)
+            timeseries["d_currencies"].append([])
 
-        nr += 1
-        rid, url, created_at, updated_at, status, manifest_json = row
+    return timeseries, inaction_days, last_entity_dt, nad
+
+
+# Daily series that resample()/rolling() carry over. Counts and sums
+# add up within a period, cumulative series take the period's last day.
+resample_keys = [
+    "manifests",
+    "projects",
+    "mfr_total",
+    "mfr_total_clipped",
+    "manifests_above_ft",
+]
+resample_periods = ["day", "week", "month"]
 
-        try:
-            manifest = json.loads(manifest_json)
-            # print(json.dumps(manifest, indent=2))
-        except json.decoder.JSONDecodeError as err:
-            print(f"At row={rid}, error:{err}")
-            errors += 1
-            continue
 
-        created_at = dateutil.parser.parse(created_at, fuzzy=True)
-        updated_at = dateutil.parser.parse(updated_at, fuzzy=True)
-        this_mdesc = {
-            "id": rid,
-            "url": url,
-            "created_at": created_at,
-            "updated_at": updated_at,
-            "updated_at": updated_at,
-            "manifest": manifest,
+def daily_arrays(timeseries):
+    """The resample_keys and etype series of a timeseries as arrays:
+    {"d_manifests": array, ..., "d_etype": {etype: array}, ...}"""
+    arrays = {}
+    for prefix in ["d_", "c_"]:
+        for key in resample_keys:
+            arrays[prefix + key] = np.asarray(timeseries[prefix + key])
+        etype = np.array(
+            [[day[key] for key in etype_keys] for day in timeseries[prefix + "etype"]],
+            dtype=np.int64,
+        ).reshape(-1, len(etype_keys))
+        arrays[prefix + "etype"] = {
+            key: etype[:, col] for col, key in enumerate(etype_keys)
         }
+    return arrays
 
-        # FLOSS/fund deos not consider disabled manifests, so remove them now
-        # Don't process further if not active
-        if status != "active":
-            print(status, url)
-            disabled += 1
-            disabled_mdesc.append(this_mdesc)
-            continue
 
-        nfl = 0  # non-free-licenses
-        mlic = {}
-        for prj in manifest["projects"]:
+def days_dates(ndays):
+    # Day n since launch, as a calendar date
+    return np.datetime64(launch_dt.date()) + np.arange(ndays)
 
-            prj_name = prj["name"]
-            if prj_name not in prj_map:
-                prj_map[prj_name] = 1
-            else:
-                prj_map[prj_name] += 1
 
-            for tag in prj["tags"]:
-                if tag in tag_count:
-                    tag_count[tag] += 1
-                else:
-                    tag_count[tag] = 1
+def resample(timeseries, period="week"):
+    """Aggregate the daily timeseries to calendar weeks (from Monday)
+    or months.
+
+    Returns a dict of arrays, one entry per period: "start" (first
+    date of the period, numpy datetime64), "days" (days of data in
+    it), then the d_ and c_ series of resample_keys, and d_etype /
+    c_etype as {etype: array}. The first period starts at launch, the
+    last one ends with the data, so either can be partial.
+    """
+    arrays = daily_arrays(timeseries)
+    dates = days_dates(len(arrays["d_manifests"]))
+    if period == "day":
+        periods = dates
+    elif period == "week":
+        # numpy weeks start on Thursdays (1970-01-01); shift to Monday
+        monday = np.datetime64("1969-12-29")
+        periods = monday + (dates - monday) // 7 * 7
+    elif period == "month":
+        periods = dates.astype("datetime64[M]")
+    else:
+        raise ValueError(f"Unknown period {period}")
+    starts = np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]])
+    ends = np.r_[starts[1:], len(dates)] - 1
+
+    def resampled(key, values):
+        if key.startswith("c_"):
+            return values[ends]
+        return np.add.reduceat(values, starts)
+
+    result = {"start": dates[starts], "days": ends - starts + 1}
+    for key, values in arrays.items():
+        if isinstance(values, dict):
+            result[key] = {k: resampled(key, v) for k, v in values.items()}
+        else:
+            result[key] = resampled(key, values)
+    return result
+
+
+def rolling(timeseries, days):
+    """Trailing days-long window sums of the daily series, one per day.
+
+    Same layout as resample(); "start" is each day's date, and "days"
+    the days in its window (fewer than days at the start). Cumulative
+    series are as they were on the day.
+    """
+    if days < 1:
+        raise ValueError(f"Window of {days} days, needs at least 1")
+    arrays = daily_arrays(timeseries)
+    ndays = len(arrays["d_manifests"])
+    idx = np.arange(ndays)
+    lo = np.maximum(idx + 1 - days, 0)
+
+    def window(key, values):
+        if key.startswith("c_"):
+            return values
+        cum = np.r_[0, np.cumsum(values)]
+        return cum[idx + 1] - cum[lo]
+
+    result = {"start": days_dates(ndays), "days": idx + 1 - lo}
+    for key, values in arrays.items():
+        if isinstance(values, dict):
+            result[key] = {k: window(key, v) for k, v in values.items()}
+        else:
+            result[key] = window(key, values)
+    return result
+
+
+def trend_report(series):
+    """Lines of text for a resample()/rolling() result"""
+    etypes = "".join(f" {key[:5]:>6s}" for key in etype_keys)
+    lines = [
+        f"{'start':10s} {'days':>4s} {'new':>6s}{etypes} "
+        f"{'projects':>8s} {'FR clipped':>12s} {'cum FR clipped':>14s}"
+    ]
+    for idx, start in enumerate(series["start"]):
+        etypes = "".join(
+            f" {series['d_etype'][key][idx]:6d}" for key in etype_keys
+        )
+        lines.append(
+            f"{str(start):10s} {series['days'][idx]:4d} "
+            f"{series['d_manifests'][idx]:6d}{etypes} "
+            f"{series['d_projects'][idx]:8d} "
+            f"{series['d_mfr_total_clipped'][idx]:12d} "
+            f"{series['c_mfr_total_clipped'][idx]:14d}"
+        )
+    return lines
+
+
+def normalize_license(lic):
+    # NOTE: potential validation bug
+    # one project has a misspelled "sdpx" rather than "spdx"
+    if lic.startswith("spdx:") or lic.startswith("sdpx:"):
+        lic = lic[5:]
+    elif lic.startswith("GNU:"):
+        lic = lic[4:]  # I see a GNU:AGPL-3.0
+
+    # Replace with standardized value
+    if lic in lic_eq_map:
+        lic = lic_eq_map[lic]
+    return lic
+
+
+def parse_timestamp(val):
+    """Parse a created_at/updated_at value from the CSV.
+
+    Returns (datetime, slow). The dump uses ISO 8601 timestamps, which
+    fromisoformat() handles quickly. Anything else goes through (much
+    slower) fuzzy parsing, and slow is set.
+    """
+    try:
+        return datetime.datetime.fromisoformat(val), False
+    except ValueError:
+        # Rarely needed, and slow to import
+        import dateutil.parser
+
+        return dateutil.parser.parse(val, fuzzy=True), True
+
 
+class ManifestRecord:
+    """One manifest, as derive_mdesc() describes it.
+
+    Holds the derived fields, and the manifest JSON as text. The
+    manifest is parsed again every time record["manifest"] is read -
+    the parsed form is several times the size of the text, and most
+    users only need the fields derived from it:
+
+      ename, etype, erole  entity name, type and role
+      project_names        names of the projects, in manifest order
+      tags                 tags of all projects, in manifest order
+
+    Reads like a dict for older code: record["funding-plan-max"],
+    "nfl" in record, record.get(), record.keys()... Fields a record
+    doesn't have (disabled and broken manifests get fewer) raise
+    KeyError.
+    """
+
+    __slots__ = (
+        "id",
+        "url",
+        "created_at",
+        "updated_at",
+        "manifest_json",
+        "ename",
+        "etype",
+        "erole",
+        "project_names",
+        "tags",
+        "nfl",
+        "licences",
+        "funding_channel_names",
+        "funding_plan_max",
+        "currencies",
+        "fin_history",
+        "fin_totals",
+    )
+    # dict style keys that aren't attribute names
+    aliases = {"funding-plan-max": "funding_plan_max", "manifest": "manifest_json"}
+    key_names = {attr: key for key, attr in aliases.items()}
+
+    def __init__(self, **fields):
+        for key, value in fields.items():
+            setattr(self, key, value)
+
+    @property
+    def manifest(self):
+        return json.loads(self.manifest_json)
+
+    def __getitem__(self, key):
+        if key == "manifest":
+            return self.manifest
+        attr = self.aliases.get(key, key)
+        if attr not in self.__slots__:
+            raise KeyError(key)
+        try:
+            return getattr(self, attr)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        if key == "manifest":
+            value = json.dumps(value)
+        attr = self.aliases.get(key, key)
+        if attr not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, attr, value)
+
+    def __contains__(self, key):
+        attr = self.aliases.get(key, key)
+        return attr in self.__slots__ and hasattr(self, attr)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return [
+            self.key_names.get(attr, attr)
+            for attr in self.__slots__
+            if hasattr(self, attr)
+        ]
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def __repr__(self):
+        return f"ManifestRecord(id={self.id!r}, url={self.url!r})"
+
+
+def derive_mdesc(row, profile=None):
+    """Derive per manifest info from one row of the CSV.
+
+    Returns (status, this_mdesc, err, slow_dates). this_mdesc is a
+    ManifestRecord. err is set if the manifest JSON could not be
+    parsed, and this_mdesc then only has the id and url. Only active
+    manifests get the derived (licences, funding...) fields.
+    slow_dates counts timestamps that were not in the expected format.
+
+    This does all the expensive per row work, and has no side effects.
+    Everything that's counted across manifests is left to summarize().
+    With a Profile, JSON decoding, date parsing and licence
+    normalisation are timed as sub-phases of "derive".
+    """
+    rid, url, created_at, updated_at, status, manifest_json = row
+
+    try:
+        with _phase(profile, "derive.json"):
+            manifest = json.loads(manifest_json)
+        # print(json.dumps(manifest, indent=2))
+    except json.decoder.JSONDecodeError as err:
+        return status, ManifestRecord(id=rid, url=url), err, 0
+
+    with _phase(profile, "derive.dates"):
+        created_at, slow_created = parse_timestamp(created_at)
+        updated_at, slow_updated = parse_timestamp(updated_at)
+    slow_dates = slow_created + slow_updated
+    this_mdesc = ManifestRecord(
+        id=rid,
+        url=url,
+        created_at=created_at,
+        updated_at=updated_at,
+        manifest_json=manifest_json,
+    )
+
+    # FLOSS/fund deos not consider disabled manifests, so remove them now
+    # Don't process further if not active
+    if status != "active":
+        return status, this_mdesc, None, slow_dates
+
+    nfl = 0  # non-free-licenses
+    mlic = {}
+    with _phase(profile, "derive.licences"):
+        for prj in manifest["projects"]:
             for lic in prj["licenses"]:
-                # NOTE: potential validation bug
-                # one project has a misspelled "sdpx" rather than "spdx"
-                if lic.startswith("spdx:") or lic.startswith("sdpx:"):
-                    lic = lic[5:]
-                elif lic.startswith("GNU:"):
-                    lic = lic[4:]  # I see a GNU:AGPL-3.0
-
-                # Replace with standardized value
-                if lic in lic_eq_map:
-                    lic = lic_eq_map[lic]
-
-                if lic in lic_map:
-                    lic_map[lic] += 1
-                else:
-                    lic_map[lic] = 1
+                lic = normalize_license(lic)
                 if lic in non_free_licenses:
                     nfl += 1
                 if lic in mlic:
@@ -250,415 +1002,1189 @@ def process_csv(csvfile):
                 else:
                     mlic[lic] = 1
 
-        this_mdesc["nfl"] = nfl
-        this_mdesc["licences"] = mlic
-        plan_max = {}
-        manifest_currencies = []
-        for plans in manifest["funding"]["plans"]:
-            freq = plans["frequency"]
-            currency = plans["currency"]
-            cmult = currency_weight[currency] / currency_weight["USD"]
-            if currency not in used_currencies:
-                used_currencies.append(currency)
-            if currency not in manifest_currencies:
-                manifest_currencies.append(currency)
+    entity = manifest["entity"]
+    this_mdesc.ename = entity["name"]
+    this_mdesc.etype = entity["type"]
+    this_mdesc.erole = entity["role"]
+    this_mdesc.project_names = [prj["name"] for prj in manifest["projects"]]
+    this_mdesc.tags = [tag for prj in manifest["projects"] for tag in prj["tags"]]
+    this_mdesc.nfl = nfl
+    this_mdesc.licences = mlic
+    plan_max = {}
+    manifest_currencies = []
+    for plans in manifest["funding"]["plans"]:
+        freq = plans["frequency"]
+        currency = plans["currency"]
+        cmult = currency_weight[currency] / currency_weight["USD"]
+        if currency not in manifest_currencies:
+            manifest_currencies.append(currency)
+        # Normalize fin totals to USD, as the FLOSS fund gives >= $$$$$ !
+        amount = plans["amount"] * cmult
+        if freq in plan_max:
+            plan_max[freq] = max(plan_max[freq], amount)
+        else:
+            plan_max[freq] = amount
+    funding_channel_types = []
+    for channels in manifest["funding"]["channels"]:
+        funding_channel_types.append(channels["guid"])
+    this_mdesc.funding_channel_names = funding_channel_types
+    max_fr = 0
+    if "one-time" in plan_max:
+        max_fr = max(plan_max["one-time"], max_fr)
+    if "monthly" in plan_max:
+        max_fr = max(plan_max["monthly"] * 12, max_fr)
+    if "yearly" in plan_max:
+        max_fr = max(plan_max["yearly"], max_fr)
+    plan_max["max-fr"] = max_fr
+    this_mdesc.funding_plan_max = plan_max
+    this_mdesc.currencies = manifest_currencies
+
+    # Financial history, normalized to USD
+    fin_history = []
+    fin_totals = {
+        "income": 0,
+        "expenses": 0,
+        "taxes": 0,
+    }
+    if "history" in manifest["funding"] and manifest["funding"]["history"]:
+        for hist in manifest["funding"]["history"]:
             # Normalize fin totals to USD, as the FLOSS fund gives >= $$$$$ !
-            amount = plans["amount"] * cmult
-            if freq in plan_max:
-                plan_max[freq] = max(plan_max[freq], amount)
+            currency = hist["currency"]
+            c_weight = (
+                currency_weight[currency] / currency_weight["USD"]
+            )  # required field
+            usd_hist = {"year": hist["year"], "currency": currency}
+            for key in ft_keys:
+                if key in hist:
+                    value = hist[key] * c_weight
+                    usd_hist[key] = value
+                    fin_totals[key] += value
+            fin_history.append(usd_hist)
+        for key in ft_keys:
+            fin_totals[key] = math.floor(fin_totals[key])
+    this_mdesc.fin_history = fin_history
+    this_mdesc.fin_totals = fin_totals
+
+    return status, this_mdesc, None, slow_dates
+
+
+def row_fingerprint(row):
+    # Identifies the content of a row, for process_csv(state=...)
+    rid, url, created_at, updated_at, status, manifest_json = row
+    digest = hashlib.blake2b(manifest_json.encode("utf-8"), digest_size=16)
+    return (url, created_at, updated_at, status, digest.digest())
+
+
+# Bump this when derive_mdesc() output changes
+state_version = 3
+
+
+def state_tables():
+    # derive_mdesc() output depends on these. If they change, state
+    # saved by an older run can't be reused.
+    return (state_version, currency_weight, lic_eq_map, non_free_licenses, ft_keys)
+
+
+def load_state(path):
+    """Load state saved by save_state(), or an empty state"""
+    try:
+        with open(path, "rb") as fp:
+            state = pickle.load(fp)
+    except FileNotFoundError:
+        return {}
+    if state.get("tables") != state_tables():
+        return {}
+    return state
+
+
+def save_state(state, path):
+    with open(path, "wb") as fp:
+        pickle.dump(state, fp, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def iter_csv_records(fp):
+    """Yield raw records from a binary CSV file, line endings included.
+
+    Joining the records gives back the file byte for byte. JSON in the
+    CSV can span lines - a line ends a record only if the quotes seen
+    so far in the record are balanced.
+    """
+    record = []
+    quotes = 0
+    for line in fp:
+        record.append(line)
+        quotes += line.count(b'"')
+        if quotes % 2 == 0:
+            yield b"".join(record)
+            record = []
+            quotes = 0
+    if record:
+        yield b"".join(record)
+
+
+def derive_chunk(rows, profile=False, memory=False):
+    # Runs in a worker. Returns derived rows, and a Profile of them
+    # if asked for one.
+    if not profile:
+        return [derive_mdesc(row) for row in rows], None
+    chunk_profile = Profile(memory)
+    with chunk_profile.tracing():
+        derived = [derive_mdesc(row, chunk_profile) for row in rows]
+    return derived, chunk_profile
+
+
+def chunked(iterable, size):
+    it = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def derive_rows(rows, workers=None, chunk_size=1000, profile=None):
+    """derive_mdesc() for all rows, results in the same order.
+
+    With workers > 1, rows are handed out in chunks to a pool of
+    that many processes. Sub-phases measured in the workers are added
+    to profile, their wall times summed over all workers.
+    """
+    if not workers or workers <= 1:
+        return [derive_mdesc(row, profile) for row in rows]
+    derived = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        for part, part_profile in pool.map(
+            derive_chunk,
+            chunked(rows, chunk_size),
+            itertools.repeat(profile is not None),
+            itertools.repeat(profile is not None and profile.memory),
+        ):
+            derived.extend(part)
+            if part_profile is not None:
+                profile.merge(part_profile)
+    return derived
+
+
+def process_csv(
+    csvfile, state=None, workers=None, profile=None, aggregators=None, shards=None
+):
+    """Process funding-manifests.csv, return (info, timeseries)
+
+    state is for incremental parsing. Pass a dict (empty, or carried
+    over from a previous run, see load_state/save_state). Rows whose
+    content didn't change since then are not parsed again, their
+    parsed manifests are taken from state. The aggregators still run
+    over every row: it's parsing that is saved, not summarizing. state
+    is updated in place to reflect this run; state["reparsed"] counts
+    the rows that had to be parsed.
+
+    workers > 1 parses rows in that many processes. Results are the
+    same as with the serial path.
+
+    profile is a Profile, to measure where the time goes. It ends up
+    in info.profile (None when not profiling), with phases read,
+    derive (and its sub-phases), summarize (likewise), and counters
+    of rows, parsed rows, disabled manifests, JSON errors and
+    timestamps that took the slow path. Rows stream from csvfile
+    either way; read is the time spent getting them, and is left out
+    of the phase that asks for them.
+
+    aggregators are the Aggregator classes run over the rows, see
+    summarize().
+
+    shards > 1 splits the file into that many byte ranges, each read,
+    parsed and aggregated in a process of its own (see
+    process_shards()). csvfile must then be a file on disk, it's
+    opened again by name. Doesn't go with state, and aggregators must
+    override Aggregator.merge() (TypeError if one doesn't).
+    """
+    if shards and shards > 1:
+        if state is not None:
+            raise ValueError("state can't be used with shards")
+        run = functools.partial(process_shards, csvfile.name, shards, workers)
+    else:
+        run = functools.partial(_process_csv, csvfile, state, workers)
+    if profile is None:
+        info, timeseries = run(None, aggregators)
+        info.profile = None
+        return info, timeseries
+
+    with profile.tracing():
+        info, timeseries = run(profile, aggregators)
+    profile.count("rows", info.nr)
+    profile.count("disabled", info.disabled)
+    profile.count("json_errors", info.errors)
+    profile.count("slow_dates", info.slow_dates)
+    info.profile = profile
+    return info, timeseries
+
+
+def _process_csv(csvfile, state, workers, profile, aggregators):
+    reader = csv.reader(csvfile)
+    # Skip the header and the localhost test line
+    rows = itertools.islice(reader, 2, None)
+    if state is None:
+        if profile is not None:
+            rows = profile.timed(rows, "read", within="derive")
+        with _phase(profile, "derive"):
+            derived = derive_rows(rows, workers, profile=profile)
+        if profile is not None:
+            profile.count("parsed", len(derived))
+        with _phase(profile, "summarize"):
+            return summarize(derived, profile, aggregators)
+
+    prev_rows = state.get("rows", {})
+    if state.get("tables") != state_tables():
+        prev_rows = {}
+    entries = []
+    changed = []
+    if profile is not None:
+        rows = profile.timed(rows, "read", within="fingerprint")
+    with _phase(profile, "fingerprint"):
+        for row in rows:
+            fingerprint = row_fingerprint(row)
+            entry = prev_rows.get(row[0])
+            if entry is None or entry[0] != fingerprint:
+                entry = [fingerprint, None]
+                changed.append((entry, row))
+            entries.append(entry)
+    with _phase(profile, "derive"):
+        for (entry, row), derived in zip(
+            changed,
+            derive_rows([row for entry, row in changed], workers, profile=profile),
+        ):
+            entry[1] = derived
+    if profile is not None:
+        profile.count("parsed", len(changed))
+    state["tables"] = state_tables()
+    state["rows"] = {entry[1][1]["id"]: entry for entry in entries}
+    state["reparsed"] = len(changed)
+
+    with _phase(profile, "summarize"):
+        return summarize([entry[1] for entry in entries], profile, aggregators)
+
+
+# Start of a record: id, url, created_at, updated_at and status, then
+# the manifest JSON. Fields may be quoted (timestamps that aren't ISO
+# 8601 have commas).
+csv_field = rb'(?:"(?:[^"\r\n]|"")*"|[^,"\r\n]*)'
+record_head = re.compile(rb"\d+," + (csv_field + rb",") * 3 + rb'[a-z]+,"?\{')
+
+# No record is near this long. Reading a record from a line that isn't
+# a record start stops here (see is_record_start()).
+max_record_bytes = 4 * 1024 * 1024
+
+
+def is_record_start(fp, offset):
+    """Whether a record starts at offset in the binary CSV file fp.
+    offset must be the start of a line.
+
+    The JSON of a manifest can span lines, so a line start may be in
+    the middle of a record. Which one it is can't be told without
+    counting quotes from the start of the file - instead, this checks
+    that the line reads as the start of a record, that what follows
+    parses as a whole record of 6 fields, and that the next line
+    starts a record too. The file position is left anywhere.
+    """
+    fp.seek(offset)
+    lines = []
+    size = 0
+    quotes = 0
+    for line in iter(fp.readline, b""):
+        if not lines and not record_head.match(line):
+            return False
+        lines.append(line)
+        size += len(line)
+        quotes += line.count(b'"')
+        if quotes % 2 == 0:
+            break
+        if size > max_record_bytes:
+            return False
+    else:
+        # Ran out of file in the middle of a quoted field
+        return False
+    try:
+        text = b"".join(lines).decode("utf-8")
+        row = next(csv.reader(io.StringIO(text, newline="")))
+    except (UnicodeDecodeError, csv.Error, StopIteration):
+        return False
+    if len(row) != 6 or not row[0].isdigit():
+        return False
+    line = fp.readline()
+    return not line or record_head.match(line) is not None
+
+
+def record_start_after(fp, offset):
+    """Offset of the first record starting at or after offset, or the
+    size of the file if there's none"""
+    fp.seek(offset - 1)
+    fp.readline()
+    while True:
+        start = fp.tell()
+        line = fp.readline()
+        if not line:
+            return start
+        if record_head.match(line) and is_record_start(fp, start):
+            return start
+        fp.seek(start + len(line))
+
+
+def shard_offsets(fp, shards):
+    """Split the records of the binary CSV file fp into shards byte
+    ranges of about the same size. Returns shards + 1 offsets, ranges
+    are from one to the next. The header and the localhost test line
+    are left out. Ranges may be empty on small files."""
+    size = os.fstat(fp.fileno()).st_size
+    fp.seek(0)
+    # Skip the header and the localhost test line
+    records = iter_csv_records(iter(fp.readline, b""))
+    start = sum(len(record) for record in itertools.islice(records, 2))
+    offsets = [start]
+    for idx in range(1, shards):
+        offset = start + (size - start) * idx // shards
+        if offset <= offsets[-1]:
+            offsets.append(offsets[-1])
+        else:
+            offsets.append(record_start_after(fp, offset))
+    offsets.append(size)
+    return offsets
+
+
+def shard_lines(fp, start, end):
+    # Lines of the byte range, decoded. The range starts and ends on
+    # record boundaries, so csv.reader sees whole records.
+    fp.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        line = fp.readline(remaining)
+        if not line:
+            return
+        remaining -= len(line)
+        yield line.decode("utf-8")
+
+
+def derive_counted(rows, profile):
+    # derive_mdesc() for rows as they come, counted as parsed
+    for row in rows:
+        profile.count("parsed")
+        yield derive_mdesc(row, profile)
+
+
+@contextlib.contextmanager
+def gc_paused():
+    # For code that makes lots of objects that all stay alive, like
+    # the records of a shard. The cyclic garbage collector would walk
+    # them over and over, to find nothing to collect. Reference
+    # counting still frees everything else.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def reduce_aggregators(aggregators):
+    for agg in aggregators:
+        agg.reduce()
+    return aggregators
+
+
+def process_shard(path, start, end, aggregators, profile=False, memory=False):
+    # Runs in a worker. Returns the aggregators after the records in
+    # start..end of the CSV at path, reduced, and a Profile if asked
+    # for one.
+    aggregators = [make() for make in aggregators]
+    with open(path, "rb") as fp, gc_paused():
+        rows = csv.reader(shard_lines(fp, start, end))
+        if not profile:
+            derived = (derive_mdesc(row) for row in rows)
+            return reduce_aggregators(aggregate(derived, aggregators)), None
+        shard_profile = Profile(memory)
+        with shard_profile.tracing():
+            # Each phase pulls from the one before, and leaves its time
+            # out of the next
+            rows = shard_profile.timed(rows, "read", within="derive")
+            derived = shard_profile.timed(
+                derive_counted(rows, shard_profile), "derive", within="aggregate"
+            )
+            with shard_profile.phase("aggregate"):
+                aggregate(derived, aggregators)
+            with shard_profile.phase("reduce"):
+                reduce_aggregators(aggregators)
+    return aggregators, shard_profile
+
+
+def process_shards(path, shards, workers=None, profile=None, aggregators=None):
+    """process_csv(), sharded: (info, timeseries) for the CSV at path.
+
+    The file is split into shards byte ranges on record boundaries
+    (see shard_offsets()). Each range is read, parsed and aggregated in
+    a process of its own, workers of them at a time (by default, one
+    per CPU). Nothing but the reduced aggregators comes back - counts,
+    and the columns of the shard's part of the ManifestTable. They are
+    merged in file order, so results are those of the serial path -
+    except that sums of floats are added up in a different order, and
+    may differ in the last bits.
+
+    The records themselves come back too, for info.mdesc and friends,
+    and unpickling them is most of what's left for this process to do.
+    Use ManifestColumns in place of Manifests when the columns are
+    enough.
+
+    With a Profile, phases are split (finding the ranges), shards
+    (all of them, wall clock) with the read, derive, aggregate and
+    reduce phases of the shards summed up, and summarize (merging,
+    and the finish() of each aggregator).
+    """
+    if aggregators is None:
+        aggregators = default_aggregators
+    unmergeable = [make for make in aggregators if make.merge is Aggregator.merge]
+    if unmergeable:
+        names = ", ".join(make.__name__ for make in unmergeable)
+        raise TypeError(f"aggregators used with shards must override merge(): {names}")
+    with _phase(profile, "split"):
+        with open(path, "rb") as fp:
+            offsets = shard_offsets(fp, shards)
+    with _phase(profile, "shards"):
+        if not workers:
+            workers = min(shards, os.cpu_count() or 1)
+        # Results are unpickled as they come in
+        with gc_paused(), concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            results = list(
+                pool.map(
+                    process_shard,
+                    itertools.repeat(path),
+                    offsets[:-1],
+                    offsets[1:],
+                    itertools.repeat(aggregators),
+                    itertools.repeat(profile is not None),
+                    itertools.repeat(profile is not None and profile.memory),
+                )
+            )
+    parts = []
+    for part, part_profile in results:
+        parts.append(part)
+        if part_profile is not None:
+            profile.merge(part_profile)
+    with _phase(profile, "summarize"):
+        with _phase(profile, "summarize.merge"):
+            merged = merge_aggregators(parts)
+        info = finish(merged, profile)
+    return info, getattr(info, "timeseries", None)
+
+
+def plain_needle(text):
+    # Text that reads the same in the raw CSV as in the manifest: JSON
+    # and CSV quoting leave it alone, and it's not \u escaped
+    return text.isascii() and text.isprintable() and not any(c in text for c in '"\\/')
+
+
+class Query:
+    """Conditions on active manifests, for query_csv(). All of those
+    given must hold.
+
+      entity    entity name contains this (ignoring case)
+      tag       a project has this tag
+      license   a project uses this licence (as normalize_license()
+                spells it, e.g. "Apache-2.0")
+      currency  a funding plan is in this currency
+      etype     entity type
+      min_fr    max funding requested, in USD, is at least this
+
+    Most conditions also give strings that a matching row's raw CSV
+    text must contain (needles). Rows without them are dropped before
+    any parsing.
+    """
+
+    def __init__(
+        self,
+        entity=None,
+        tag=None,
+        license=None,
+        currency=None,
+        etype=None,
+        min_fr=None,
+    ):
+        self.entity = entity
+        self.tag = tag
+        self.license = license
+        self.currency = currency
+        self.etype = etype
+        self.min_fr = min_fr
+
+        def quoted(text):
+            # A JSON string, as it is in the CSV (quotes doubled)
+            return f'""{text}""'.encode("utf-8")
+
+        # Each entry is a list of alternatives, one of which must be in
+        # the row. Only conditions that can be checked on the text give
+        # needles. entity is checked on the lower cased row.
+        self.needles = []
+        self.entity_needle = None
+        if entity is not None and plain_needle(entity):
+            self.entity_needle = entity.lower().encode("utf-8")
+        if tag is not None and plain_needle(tag):
+            self.needles.append([quoted(tag)])
+        if currency is not None and plain_needle(currency):
+            self.needles.append([quoted(currency)])
+        if etype is not None and plain_needle(etype):
+            self.needles.append([quoted(etype)])
+        if license is not None:
+            # Spellings that normalize_license() turns into license.
+            # Prefixes only make the raw text longer.
+            spellings = [license] + [
+                lic for lic, std in lic_eq_map.items() if std == license
+            ]
+            if all(plain_needle(lic) for lic in spellings):
+                self.needles.append([lic.encode("utf-8") for lic in spellings])
+
+    def prefilter(self, record):
+        """False if the raw CSV record (bytes) can't match"""
+        for alternatives in self.needles:
+            if not any(needle in record for needle in alternatives):
+                return False
+        if self.entity_needle is not None:
+            return self.entity_needle in record.lower()
+        return True
+
+    def matches(self, mdesc):
+        """True if the ManifestRecord of an active manifest matches"""
+        if self.entity is not None and self.entity.lower() not in mdesc.ename.lower():
+            return False
+        if self.tag is not None and self.tag not in mdesc.tags:
+            return False
+        if self.license is not None and self.license not in mdesc.licences:
+            return False
+        if self.currency is not None and self.currency not in mdesc.currencies:
+            return False
+        if self.etype is not None and self.etype != mdesc.etype:
+            return False
+        if self.min_fr is not None:
+            return mdesc.funding_plan_max["max-fr"] >= self.min_fr
+        return True
+
+
+def query_csv(fp, query):
+    """ManifestRecords of active manifests in the binary CSV file fp
+    that match query, in file order.
+
+    Conditions are checked as early as they can be: Query.prefilter()
+    on the raw record, then the status column, and only the rows left
+    are parsed and derived. Returns (records, counts), counts having
+    the number of rows, those dropped by the prefilter, and those
+    parsed.
+    """
+    records = []
+    counts = {"rows": 0, "prefiltered": 0, "parsed": 0}
+    raw_records = itertools.islice(iter_csv_records(fp), 2, None)
+    for record in raw_records:
+        counts["rows"] += 1
+        if not query.prefilter(record):
+            counts["prefiltered"] += 1
+            continue
+        row = next(csv.reader(io.StringIO(record.decode("utf-8"), newline="")))
+        if row[4] != "active":
+            continue
+        counts["parsed"] += 1
+        status, this_mdesc, err, slow_dates = derive_mdesc(row)
+        if err is None and query.matches(this_mdesc):
+            records.append(this_mdesc)
+    return records, counts
+
+
+def change_summary(status, this_mdesc, err):
+    # What replay_snapshots() tracks about a manifest
+    if err is not None:
+        return {"status": "error", "url": this_mdesc["url"]}
+    summary = {
+        "status": status,
+        "url": this_mdesc["url"],
+        "updated_at": this_mdesc["updated_at"],
+    }
+    if status == "active":
+        summary["max-fr"] = this_mdesc["funding-plan-max"]["max-fr"]
+        summary["plans"] = this_mdesc["manifest"]["funding"]["plans"]
+        summary["fin_totals"] = this_mdesc["fin_totals"]
+    return summary
+
+
+def replay_snapshots(snapshots):
+    """Track how manifests change across snapshots of the dump.
+
+    snapshots yields (last_modified, csvfile), oldest first. Returns a
+    timeline for every manifest id: a list of dicts, one for every
+    snapshot where the manifest appeared, changed, or went away.
+    Each has "at" (the snapshot's last_modified), "status" ("removed"
+    if it went away), "url", "updated_at", and for active manifests
+    "max-fr", "plans" and "fin_totals".
+
+    Only rows that differ from the previous snapshot are parsed, so
+    a replay costs about one full parse plus the churn.
+    """
+    timeline = {}
+    prev = {}  # id => (row fingerprint, summary)
+    for last_modified, csvfile in snapshots:
+        current = {}
+        for row in itertools.islice(csv.reader(csvfile), 2, None):
+            rid = row[0]
+            fingerprint = row_fingerprint(row)
+            entry = prev.get(rid)
+            if entry is not None and entry[0] == fingerprint:
+                current[rid] = entry
+                continue
+            summary = change_summary(*derive_mdesc(row)[:3])
+            current[rid] = (fingerprint, summary)
+            if entry is None or entry[1] != summary:
+                if rid not in timeline:
+                    timeline[rid] = []
+                timeline[rid].append({"at": last_modified, **summary})
+        for rid in prev.keys() - current.keys():
+            timeline[rid].append(
+                {"at": last_modified, "status": "removed", "url": prev[rid][1]["url"]}
+            )
+        prev = current
+    return timeline
+
+
+def merge_counts(into, other):
+    # Counters are dicts in order of first appearance. Folding in the
+    # counts of later rows keeps that order.
+    for key, count in other.items():
+        if key in into:
+            into[key] += count
+        else:
+            into[key] = count
+
+
+class Aggregator:
+    """One statistic (or a few related ones) over the manifests.
+
+    summarize() makes a single pass over derive_mdesc() output, in CSV
+    order. add() is called with every active manifest, add_row() with
+    every row (status, record, err, slow_dates), if the aggregator
+    overrides it.
+
+    merge(other) folds in an aggregator of the same kind that saw the
+    rows after the ones this one saw, so rows can be aggregated in
+    chunks. There is no default: aggregators used with
+    process_shards() must override it, and are checked for it before
+    any shard is read. finish(info) sets the results as attributes of info. It
+    runs once all rows are in, in the order aggregators are listed, so
+    it may use what earlier aggregators set. It is timed as phase.
+
+    reduce() is called in a shard's process (see process_shards()),
+    once the shard's rows are in and before the aggregator is sent
+    back to be merged. Aggregators that keep per manifest lists can
+    make them into something smaller or quicker to send there. Parts
+    that are merged are either all reduced, or none of them.
+    """
+
+    phase = "summarize.aggregate"
+
+    def add(self, this_mdesc):
+        pass
+
+    def add_row(self, status, this_mdesc, err, slow_dates):
+        pass
+
+    def merge(self, other):
+        raise NotImplementedError(f"{type(self).__name__} does not override merge()")
+
+    def reduce(self):
+        pass
+
+    def finish(self, info):
+        pass
+
+
+class RowCounts(Aggregator):
+    """nr, disabled, errors, slow_dates, disabled_mdesc. Disabled and
+    broken manifests are reported on stdout."""
+
+    def __init__(self):
+        self.nr = 0
+        self.disabled = 0
+        self.errors = 0
+        self.slow_dates = 0
+        self.disabled_mdesc = []
+        # (status, this_mdesc, err) of rows to report, in order
+        self.notes = []
+
+    def add_row(self, status, this_mdesc, err, slow_dates):
+        self.nr += 1
+        self.slow_dates += slow_dates
+        if err is not None:
+            self.errors += 1
+            self.notes.append((status, this_mdesc, err))
+        elif status != "active":
+            self.disabled += 1
+            self.disabled_mdesc.append(this_mdesc)
+            self.notes.append((status, this_mdesc, err))
+
+    def merge(self, other):
+        self.nr += other.nr
+        self.disabled += other.disabled
+        self.errors += other.errors
+        self.slow_dates += other.slow_dates
+        self.disabled_mdesc.extend(other.disabled_mdesc)
+        self.notes.extend(other.notes)
+
+    def finish(self, info):
+        for status, this_mdesc, err in self.notes:
+            if err is not None:
+                print(f"At row={this_mdesc['id']}, error:{err}")
             else:
-                plan_max[freq] = amount
-        funding_channel_types = []
-        for channels in manifest["funding"]["channels"]:
-            funding_channel_types.append(channels['guid'])
-        this_mdesc["funding_channel_names"] = funding_channel_types
-        max_fr = 0
-        if "one-time" in plan_max:
-            max_fr = max(plan_max["one-time"], max_fr)
-        if "monthly" in plan_max:
-            max_fr = max(plan_max["monthly"] * 12, max_fr)
-        if "yearly" in plan_max:
-            max_fr = max(plan_max["yearly"], max_fr)
-        plan_max["max-fr"] = max_fr
-        if max_fr >= ft:
-            meets_ft += 1
-        this_mdesc["funding-plan-max"] = plan_max
-        this_mdesc["currencies"] = manifest_currencies
+                print(status, this_mdesc["url"])
+        info.nr = self.nr
+        info.disabled = self.disabled
+        info.errors = self.errors
+        info.slow_dates = self.slow_dates
+        info.disabled_mdesc = self.disabled_mdesc
+
+
+class Manifests(Aggregator):
+    """mdesc (ordered by creation, highest funding requirements first
+    on ties), table (a ManifestTable, in the same order), by_created
+    (that order, as indices into table) and mdesc_by_ename (entities
+    with more than one manifest). Shards build their part of the table
+    themselves."""
+
+    phase = "summarize.table"
+    keep_records = True
+
+    def __init__(self):
+        self.mdesc = []
+        self.tables = []
+
+    def add(self, this_mdesc):
+        self.mdesc.append(this_mdesc)
+
+    def merge(self, other):
+        self.mdesc.extend(other.mdesc)
+        self.tables.extend(other.tables)
+
+    def reduce(self):
+        table = ManifestTable(self.mdesc)
+        if not self.keep_records:
+            table.records = None
+        self.tables = [table]
+        self.mdesc = []
+
+    def finish(self, info):
+        if not self.tables:
+            self.reduce()
+        table = self.tables[0]
+        if len(self.tables) > 1:
+            table = ManifestTable.concat(self.tables)
+        # FIXME Right now, we do not consider scenarios where a manifest went
+        # through a change in financial requirements. Not many days have
+        # passed since launch, so this is a reasonable assumption to make.
+        # Over a long term, changes to manifest would need to be tracked.
+        # replay_snapshots() has the changes, given the history of the dump.
+        info.by_created = np.lexsort((-table.max_fr, table.created_at))
+        info.table = table
+        if table.records is None:
+            return
+        info.mdesc = table.take(info.by_created)
+
+        # entity with the same name can submit multiple manifests.
+        # let's figure out who. It's a wide world, so names may match.
+        # Don't claim similarity, unless verified by other means
+        counts = np.bincount(table.ename, minlength=len(table.enames))
+        mdesc_by_ename = {}
+        for idx in np.flatnonzero(counts[table.ename] > 1).tolist():
+            ename = table.enames[table.ename[idx]]
+            if ename not in mdesc_by_ename:
+                mdesc_by_ename[ename] = []
+            mdesc_by_ename[ename].append(table.records[idx])
+        info.mdesc_by_ename = mdesc_by_ename
+
+
+class ManifestColumns(Manifests):
+    """Manifests, without the records: table (its records are None)
+    and by_created, no mdesc or mdesc_by_ename. For code that works
+    on the columns - in sharded runs, nothing per manifest is then
+    sent back from the shards but the columns."""
+
+    keep_records = False
+
+
+class ProjectNames(Aggregator):
+    """prj_map: project name => count"""
+
+    def __init__(self):
+        # It's a wide world, so name clashes may happen. We'll use this
+        # to create a tag cloud
+        self.prj_map = {}
+
+    def add(self, this_mdesc):
+        for prj_name in this_mdesc.project_names:
+            if prj_name not in self.prj_map:
+                self.prj_map[prj_name] = 1
+            else:
+                self.prj_map[prj_name] += 1
+
+    def merge(self, other):
+        merge_counts(self.prj_map, other.prj_map)
+
+    def finish(self, info):
+        info.prj_map = self.prj_map
+
+
+class Tags(Aggregator):
+    """tag_count (usage count for every tag used in projects), tc_list
+    (the same, most used first), and unused_tags (known tags no
+    project uses)"""
+
+    phase = "summarize.tags"
+
+    def __init__(self):
+        self.tag_count = {}
+
+    def add(self, this_mdesc):
+        for tag in this_mdesc.tags:
+            if tag in self.tag_count:
+                self.tag_count[tag] += 1
+            else:
+                self.tag_count[tag] = 1
+
+    def merge(self, other):
+        merge_counts(self.tag_count, other.tag_count)
+
+    def finish(self, info):
+        # project-tags.txt is a copy of https://floss.fund/static/project-tags.txt
+        with open("project-tags.txt", "r") as fp:
+            known_tags = [x.strip() for x in fp.readlines()]
+        unused_tags = {}
+        for tag in known_tags:
+            if tag not in self.tag_count:
+                unused_tags[tag] = 1
+        tc_list = list(zip(self.tag_count.keys(), self.tag_count.values()))
+        tc_list.sort(key=lambda x: x[1], reverse=True)
+        info.tag_count = self.tag_count
+        info.tc_list = tc_list
+        info.unused_tags = unused_tags
+
 
-        mdesc.append(this_mdesc)
+class Licences(Aggregator):
+    """lic_map: licence => number of projects using it"""
 
-        ename = manifest["entity"]["name"]
-        if ename not in mdesc_by_ename:
-            mdesc_by_ename[ename] = []
-        mdesc_by_ename[ename].append(this_mdesc)
+    def __init__(self):
+        self.lic_map = {}
 
-        # Update stats
+    def add(self, this_mdesc):
+        for lic, count in this_mdesc["licences"].items():
+            if lic in self.lic_map:
+                self.lic_map[lic] += count
+            else:
+                self.lic_map[lic] = count
+
+    def merge(self, other):
+        merge_counts(self.lic_map, other.lic_map)
+
+    def finish(self, info):
+        info.lic_map = self.lic_map
+
+
+class Currencies(Aggregator):
+    """used_currencies (funding plans and history), cur_fr (funding
+    requested in USD, by currency, of single currency manifests), and
+    mc_projects (multi-currency manifests, an indicator of wider
+    collaboration)"""
+
+    def __init__(self):
+        self.used_currencies = []
+        self.cur_fr = {}
+        self.mc_projects = []
+
+    def add(self, this_mdesc):
+        manifest_currencies = this_mdesc["currencies"]
+        for currency in manifest_currencies:
+            if currency not in self.used_currencies:
+                self.used_currencies.append(currency)
+        for hist in this_mdesc["fin_history"]:
+            if hist["currency"] not in self.used_currencies:
+                self.used_currencies.append(hist["currency"])
+        max_fr = this_mdesc["funding-plan-max"]["max-fr"]
         npc = len(manifest_currencies)
         primary_cur = manifest_currencies[0]
-        if primary_cur not in cur_fr:
-            cur_fr[primary_cur] = 0
+        if primary_cur not in self.cur_fr:
+            self.cur_fr[primary_cur] = 0
         if npc == 1:
-            cur_fr[primary_cur] += max_fr
+            self.cur_fr[primary_cur] += max_fr
         elif npc > 1:
-            mc_projects.append({"currencies": manifest_currencies, "mdesc": this_mdesc})
-            # print(
-            #    f"WARNING: project id={rid} uses more than one currency({manifest_currencies}). Handle this. max_fr={max_fr}"
-            # )
-
-        etype = manifest["entity"]["type"]
-        if etype in etype_count:
-            etype_count[etype] += 1
-            etype_proj_count[etype] += len(manifest["projects"])
-            etype_max_fr[etype] = max(etype_max_fr[etype], max_fr)
+            self.mc_projects.append(
+                {"currencies": manifest_currencies, "mdesc": this_mdesc}
+            )
+
+    def merge(self, other):
+        for currency in other.used_currencies:
+            if currency not in self.used_currencies:
+                self.used_currencies.append(currency)
+        merge_counts(self.cur_fr, other.cur_fr)
+        self.mc_projects.extend(other.mc_projects)
+
+    def finish(self, info):
+        info.used_currencies = self.used_currencies
+        info.cur_fr = self.cur_fr
+        info.mc_projects = self.mc_projects
+
+
+class Entities(Aggregator):
+    """Counts by entity type and role, and of manifests above the
+    funding threshold or asking for nothing: meets_ft, manifests_zfr,
+    etype_count, etype_proj_count, etype_max_fr, etype_meets_ft,
+    erole_count"""
+
+    def __init__(self):
+        self.meets_ft = 0
+        self.manifests_zfr = 0  # zero fund requested !
+        self.etype_count = {}
+        self.etype_proj_count = {}
+        self.etype_max_fr = {}
+        self.etype_meets_ft = {}
+        self.erole_count = {}
+
+    def add(self, this_mdesc):
+        max_fr = this_mdesc["funding-plan-max"]["max-fr"]
+        etype = this_mdesc.etype
+        nprojects = len(this_mdesc.project_names)
+        if etype in self.etype_count:
+            self.etype_count[etype] += 1
+            self.etype_proj_count[etype] += nprojects
+            self.etype_max_fr[etype] = max(self.etype_max_fr[etype], max_fr)
         else:
-            etype_count[etype] = 1
-            etype_proj_count[etype] = len(manifest["projects"])
-            etype_max_fr[etype] = max_fr
+            self.etype_count[etype] = 1
+            self.etype_proj_count[etype] = nprojects
+            self.etype_max_fr[etype] = max_fr
 
         if max_fr >= ft:
-            if etype in etype_meets_ft:
-                etype_meets_ft[etype] += 1
+            self.meets_ft += 1
+            if etype in self.etype_meets_ft:
+                self.etype_meets_ft[etype] += 1
             else:
-                etype_meets_ft[etype] = 1
+                self.etype_meets_ft[etype] = 1
+        if max_fr == 0:
+            self.manifests_zfr += 1
 
-        erole = manifest["entity"]["role"]
-        if erole in erole_count:
-            erole_count[erole] += 1
+        erole = this_mdesc.erole
+        if erole in self.erole_count:
+            self.erole_count[erole] += 1
         else:
-            erole_count[erole] = 1
+            self.erole_count[erole] = 1
 
-        fin_totals = {
-            "income": 0,
-            "expenses": 0,
-            "taxes": 0,
-        }
-        if "history" in manifest["funding"] and manifest["funding"]["history"]:
-            for hist in manifest["funding"]["history"]:
-                year = hist["year"]
-                if year not in annual_fin_totals:
-                    annual_fin_totals[year] = {
-                        "income": 0,
-                        "expenses": 0,
-                        "taxes": 0,
-                    }
-                # Normalize fin totals to USD, as the FLOSS fund gives >= $$$$$ !
-                currency = hist["currency"]
-                if currency not in used_currencies:
-                    used_currencies.append(currency)
-                c_weight = (
-                    currency_weight[currency] / currency_weight["USD"]
-                )  # required field
-                for key in ft_keys:
-                    if key in hist:
-                        value = hist[key] * c_weight
-                        annual_fin_totals[year][key] += value
-                        fin_totals[key] += value
-            for key in ft_keys:
-                if fin_totals[key] > 0:
-                    manifest_fin_count[key] += 1
-                fin_totals[key] = math.floor(fin_totals[key])
-        this_mdesc["fin_totals"] = fin_totals
+    def merge(self, other):
+        self.meets_ft += other.meets_ft
+        self.manifests_zfr += other.manifests_zfr
+        for etype, max_fr in other.etype_max_fr.items():
+            if etype in self.etype_max_fr:
+                max_fr = max(self.etype_max_fr[etype], max_fr)
+            self.etype_max_fr[etype] = max_fr
+        merge_counts(self.etype_count, other.etype_count)
+        merge_counts(self.etype_proj_count, other.etype_proj_count)
+        merge_counts(self.etype_meets_ft, other.etype_meets_ft)
+        merge_counts(self.erole_count, other.erole_count)
 
-        if max_fr == 0:
-            manifests_zfr += 1
+    def finish(self, info):
+        info.meets_ft = self.meets_ft
+        info.manifests_zfr = self.manifests_zfr
+        info.etype_count = self.etype_count
+        info.etype_proj_count = self.etype_proj_count
+        info.etype_max_fr = self.etype_max_fr
+        info.etype_meets_ft = self.etype_meets_ft
+        info.erole_count = self.erole_count
 
-    for year in annual_fin_totals:
+
+class Financials(Aggregator):
+    """annual_fin_totals (year => totals in USD), fin_totals (over all
+    years) and manifest_fin_count (manifests reporting each of
+    ft_keys)"""
+
+    def __init__(self):
+        self.annual_fin_totals = {}
+        self.manifest_fin_count = zero_fin_totals()
+
+    def add(self, this_mdesc):
+        if not this_mdesc["fin_history"]:
+            return
+        fin_totals = zero_fin_totals()
+        for hist in this_mdesc["fin_history"]:
+            year = hist["year"]
+            if year not in self.annual_fin_totals:
+                self.annual_fin_totals[year] = zero_fin_totals()
+            for key in ft_keys:
+                if key in hist:
+                    self.annual_fin_totals[year][key] += hist[key]
+                    fin_totals[key] += hist[key]
         for key in ft_keys:
-            value = math.floor(annual_fin_totals[year][key])
-            annual_fin_totals[year][key] = value
-            fin_totals[key] += value
-
-    mdn = copy.copy(mdesc_by_ename)
-    for ename in mdesc_by_ename:
-        mdesc_list = mdesc_by_ename[ename]
-        if len(mdesc_list) == 1:
-            mdn.pop(ename)
-    mdesc_by_ename = mdn
-
-    for minfo in mdesc:
-        max_fr = minfo["funding-plan-max"]["max-fr"]
+            if fin_totals[key] > 0:
+                self.manifest_fin_count[key] += 1
+
+    def merge(self, other):
+        for year, totals in other.annual_fin_totals.items():
+            if year not in self.annual_fin_totals:
+                self.annual_fin_totals[year] = zero_fin_totals()
+            merge_counts(self.annual_fin_totals[year], totals)
+        merge_counts(self.manifest_fin_count, other.manifest_fin_count)
+
+    def finish(self, info):
+        fin_totals = zero_fin_totals()
+        for year in self.annual_fin_totals:
+            for key in ft_keys:
+                value = math.floor(self.annual_fin_totals[year][key])
+                self.annual_fin_totals[year][key] = value
+                fin_totals[key] += value
+        info.annual_fin_totals = self.annual_fin_totals
+        info.fin_totals = fin_totals
+        info.manifest_fin_count = self.manifest_fin_count
+
+
+class ClippedFunding(Aggregator):
+    """Funding requested per manifest, as the funding bar plots it:
+    ety_clipped_funding (sorted, clipped to fmax, with the sum of
+    requests below ft as the first entry), ety_clipped_colors,
+    fr_below_ft and ety_clipped_sum"""
+
+    def __init__(self):
+        self.ety_clipped_funding = []
+        self.fr_below_ft = []
+        self.ety_clipped_sum = 0
+
+    def add(self, this_mdesc):
+        max_fr = this_mdesc["funding-plan-max"]["max-fr"]
         if max_fr >= ft:
             max_fr = min(max_fr, fmax)
-            ety_clipped_funding.append(max_fr)
+            self.ety_clipped_funding.append(max_fr)
         elif max_fr > 0:
             # accumulate values below 10k in one bucket
-            fr_below_ft.append(max_fr)
+            self.fr_below_ft.append(max_fr)
             # we ignore 0 as we can't meaningfully process it
             # here
-        ety_clipped_sum += max_fr
+        self.ety_clipped_sum += max_fr
 
-    ety_clipped_funding.sort()
-    ety_clipped_colors = [val2color(x) for x in ety_clipped_funding]
+    def merge(self, other):
+        self.ety_clipped_funding.extend(other.ety_clipped_funding)
+        self.fr_below_ft.extend(other.fr_below_ft)
+        self.ety_clipped_sum += other.ety_clipped_sum
 
-    # Highest funding requirements float to the top!
-    mdesc.sort(key=lambda x: x["funding-plan-max"]["max-fr"], reverse=True)
-    bucket1 = sum(fr_below_ft)
-    ety_clipped_funding.insert(0, bucket1)
-    ety_clipped_colors.insert(0, b1_color)
+    def finish(self, info):
+        ety_clipped_funding = sorted(self.ety_clipped_funding)
+        ety_clipped_colors = [val2color(x) for x in ety_clipped_funding]
+        ety_clipped_funding.insert(0, sum(self.fr_below_ft))
+        ety_clipped_colors.insert(0, b1_color)
+        info.ety_clipped_funding = ety_clipped_funding
+        info.ety_clipped_colors = ety_clipped_colors
+        info.fr_below_ft = self.fr_below_ft
+        info.ety_clipped_sum = self.ety_clipped_sum
 
-    # Compute, for every day
-    # - incoming manifests
-    # - entity type of incoming manifests
-    # - additional projects
-    # - cumulative funding stats
 
-    # Compute, for every day since the launch of the FLOSS fund,
-    #
-    # Additional
-    #   manifests, projects
-    #   entity types (org/individual/group)
-    #   manifests above funding threshold
-    #
-    # FIXME Right now, we do not consider scenarios where a manifest went
-    # through a change in financial requirements. Not many days have
-    # passed since launch, so this is a reasonable assumption to make.
-    # Over a long term, changes to manifest would need to be tracked.
-    mdesc.sort(key=lambda x: x["created_at"])
-
-    # FLOSS fund was launched on 15th October 2024, nominally
-    # 10 AM IST => UTC + 5:30.
-    launch_dt = datetime.datetime(2024, 10, 15, 15, 30, tzinfo=datetime.UTC)
-    day_since_launch = 0
-
-    (
-        c_manifests,
-        c_projects,
-        c_etype,
-        c_fin_totals,
-        c_manifests_above_ft,
-        c_mfr_total,
-        c_mfr_total_clipped,
-        c_currencies,
-    ) = reset_counters()
-    (
-        d_manifests,
-        d_projects,
-        d_etype,
-        d_fin_totals,
-        d_manifests_above_ft,
-        d_mfr_total,
-        d_mfr_total_clipped,
-        d_currencies,
-    ) = reset_counters()
-
-    # We'll save a timeseries for plotting
-    timeseries = {
-        "t": [],  # day since launch
-        "d_manifests": [],
-        "d_projects": [],
-        "d_mfr_total": [],
-        "d_mfr_total_clipped": [],
-        "d_etype": [],
-        "d_manifests_above_ft": [],
-        "d_fin_totals": [],
-        "d_currencies": [],
-        "c_manifests": [],
-        "c_projects": [],
-        "c_mfr_total": [],
-        "c_mfr_total_clipped": [],
-        "c_etype": [],
-        "c_manifests_above_ft": [],
-        "c_fin_totals": [],
-        "c_currencies": [],
-    }
+class Timeseries(Aggregator):
+    """timeseries (see build_timeseries()), inaction_days,
+    last_entity_dt and nad. Works from the table Manifests sets up, so
+    it has nothing of its own to collect."""
 
-    for idx, minfo in enumerate(mdesc):
-        tdiff = minfo["created_at"] - launch_dt
-        if (tdiff.days > day_since_launch) or (idx == len(mdesc) - 1):
-            c_manifests += d_manifests
-            c_projects += d_projects
-            c_mfr_total += d_mfr_total
-            c_mfr_total_clipped += d_mfr_total_clipped
-            c_mfr_total = math.floor(c_mfr_total)
-            c_mfr_total_clipped = math.floor(c_mfr_total_clipped)
-            d_mfr_total = math.floor(d_mfr_total)
-            d_mfr_total_clipped = math.floor(d_mfr_total_clipped)
-            d_currencies.sort()
-            for currency in d_currencies:
-                if currency not in c_currencies:
-                    c_currencies.append(currency)
-            for key in d_etype:
-                c_etype[key] += d_etype[key]
-            c_manifests_above_ft += d_manifests_above_ft
-            # save in time series
-            timeseries["t"].append(day_since_launch)
-            timeseries["d_manifests"].append(copy.copy(d_manifests))
-            timeseries["d_projects"].append(copy.copy(d_projects))
-            timeseries["d_mfr_total"].append(copy.copy(d_mfr_total))
-            timeseries["d_mfr_total_clipped"].append(copy.copy(d_mfr_total_clipped))
-            timeseries["d_etype"].append(copy.copy(d_etype))
-            timeseries["d_manifests_above_ft"].append(d_manifests_above_ft)
-            timeseries["d_fin_totals"].append(d_fin_totals)
-            timeseries["d_currencies"].append(d_currencies)
-            timeseries["c_manifests"].append(copy.copy(c_manifests))
-            timeseries["c_projects"].append(copy.copy(c_projects))
-            timeseries["c_mfr_total"].append(copy.copy(c_mfr_total))
-            timeseries["c_mfr_total_clipped"].append(copy.copy(c_mfr_total_clipped))
-            timeseries["c_etype"].append(copy.copy(c_etype))
-            timeseries["c_manifests_above_ft"].append(c_manifests_above_ft)
-            timeseries["c_fin_totals"].append(c_fin_totals)
-            timeseries["c_currencies"].append(c_currencies)
-            (
-                d_manifests,
-                d_projects,
-                d_etype,
-                d_fin_totals,
-                d_manifests_above_ft,
-                d_mfr_total,
-                d_mfr_total_clipped,
-                d_currencies,
-            ) = reset_counters()
-            day_since_launch = tdiff.days
-        manifest = minfo["manifest"]
-        d_manifests += 1
-        d_projects += len(manifest["projects"])
-        me_type = manifest["entity"]["type"]
-        d_etype[me_type] += 1
-        if minfo["funding-plan-max"]["max-fr"] >= ft:
-            d_manifests_above_ft += 1
-        d_mfr_total += minfo["funding-plan-max"]["max-fr"]
-        d_mfr_total_clipped += fund_clip(minfo["funding-plan-max"]["max-fr"])
-        for key in d_fin_totals:
-            d_fin_totals[key] += minfo["fin_totals"][key]
-            c_fin_totals[key] += minfo["fin_totals"][key]
-        for plans in manifest["funding"]["plans"]:
-            currency = plans["currency"]
-            if currency not in d_currencies:
-                d_currencies.append(currency)
-        if "history" in manifest["funding"] and manifest["funding"]["history"]:
-            for hist in manifest["funding"]["history"]:
-                currency = hist["currency"]
-                if currency not in d_currencies:
-                    d_currencies.append(currency)
-    # fill holes in the timeseries. Not on every day may new manifests be submitted.
-    # On a day where d_ values don't change, they must be set to 0
-    ts2 = copy.deepcopy(timeseries)
-    for idx, (start, end) in enumerate(zip(timeseries["t"][:-1], timeseries["t"][1:])):
-        if end > start + 1:
-            # we have no action for one or more days
-            # print(start, end)
-            for di in range(end - start - 1):
-                inaction_days += 1
-                this_idx = start + di + 1
-                ts2["t"].insert(this_idx, this_idx)
-                for key in [
-                    "manifests",
-                    "projects",
-                    "mfr_total",
-                    "mfr_total_clipped",
-                    "etype",
-                    "manifests_above_ft",
-                    "fin_totals",
-                    "currencies",
-                ]:
-                    key_name = f"c_{key}"
-                    ts2[key_name].insert(this_idx, timeseries[key_name][idx])
-                (
-                    d_manifests,
-                    d_projects,
-                    d_etype,
-                    d_fin_totals,
-                    d_manifests_above_ft,
-                    d_mfr_total,
-                    d_mfr_total_clipped,
-                    d_currencies,
-                ) = reset_counters()
-                ts2["d_manifests"].insert(this_idx, d_manifests)
-                ts2["d_projects"].insert(this_idx, d_projects)
-                ts2["d_etype"].insert(this_idx, d_etype)
-                ts2["d_fin_totals"].insert(this_idx, d_fin_totals)
-                ts2["d_manifests_above_ft"].insert(this_idx, d_manifests_above_ft)
-                ts2["d_mfr_total"].insert(this_idx, d_mfr_total)
-                ts2["d_mfr_total_clipped"].insert(this_idx, d_mfr_total_clipped)
-                ts2["d_currencies"].insert(this_idx, d_currencies)
+    phase = "summarize.timeseries"
 
-    last_entity_dt = launch_dt + datetime.timedelta(timeseries["t"][-1])
-    nad = datetime.datetime.now(datetime.UTC) - last_entity_dt
-    # Insert zeros at the end of the arrays - corresponding to
-    # trailing days that did not see any new entity joining
-    for idx in range(nad.days):
-        ts2["t"].append(timeseries["t"][-1])
-        for key in [
-            "manifests",
-            "projects",
-            "mfr_total",
-            "mfr_total_clipped",
-            "etype",
-            "manifests_above_ft",
-            "fin_totals",
-            "currencies",
-        ]:
-            key_name = f"c_{key}"
-            ts2[key_name].append(timeseries[key_name][-1])
-        (
-            d_manifests,
-            d_projects,
-            d_etype,
-            d_fin_totals,
-            d_manifests_above_ft,
-            d_mfr_total,
-            d_mfr_total_clipped,
-            d_currencies,
-        ) = reset_counters()
-        ts2["d_manifests"].append(d_manifests)
-        ts2["d_projects"].append(d_projects)
-        ts2["d_etype"].append(d_etype)
-        ts2["d_fin_totals"].append(d_fin_totals)
-        ts2["d_manifests_above_ft"].append(d_manifests_above_ft)
-        ts2["d_mfr_total"].append(d_mfr_total)
-        ts2["d_mfr_total_clipped"].append(d_mfr_total_clipped)
-        ts2["d_currencies"].append(d_currencies)
-
-    # Done expanding, so rename
-    timeseries = ts2
-    del ts2
-    # pprint(timeseries)
-
-    # Compute info for tags.
-    # project-tags.txt is a copy of https://floss.fund/static/project-tags.txt
-    known_tags = [x.strip() for x in open("project-tags.txt", "r").readlines()]
-    used_tags = list(tag_count.keys())
-    unused_tags = {}
-    for tag in known_tags:
-        if tag not in used_tags:
-            unused_tags[tag] = 1
-    tc_list = list(zip(tag_count.keys(), tag_count.values()))
-    tc_list.sort(key=lambda x: x[1], reverse=True)
-
-    class Info:
+    def merge(self, other):
         pass
 
+    def finish(self, info):
+        timeseries, inaction_days, last_entity_dt, nad = build_timeseries(
+            info.table, info.by_created, info.profile
+        )
+        info.timeseries = timeseries
+        info.inaction_days = inaction_days
+        info.last_entity_dt = last_entity_dt
+        info.nad = nad
+
+
+class FundingChannels(Aggregator):
+    """fc_freq: funding channel name => number of manifests using it.
+    Not one of default_aggregators."""
+
+    def __init__(self):
+        self.fc_freq = {}
+
+    def add(self, this_mdesc):
+        for name in this_mdesc.funding_channel_names:
+            if name in self.fc_freq:
+                self.fc_freq[name] += 1
+            else:
+                self.fc_freq[name] = 1
+
+    def merge(self, other):
+        merge_counts(self.fc_freq, other.fc_freq)
+
+    def finish(self, info):
+        info.fc_freq = self.fc_freq
+
+
+# What summarize() computes, unless told otherwise. Timeseries needs
+# what Manifests sets up.
+default_aggregators = [
+    RowCounts,
+    Manifests,
+    ProjectNames,
+    Tags,
+    Licences,
+    Currencies,
+    Entities,
+    Financials,
+    ClippedFunding,
+    Timeseries,
+]
+
+
+def aggregate(derived, aggregators):
+    """Feed derive_mdesc() output (in CSV order) to aggregators, in
+    one pass. Returns aggregators."""
+    row_aggregators = [
+        agg for agg in aggregators if type(agg).add_row is not Aggregator.add_row
+    ]
+    for status, this_mdesc, err, slow_dates in derived:
+        for agg in row_aggregators:
+            agg.add_row(status, this_mdesc, err, slow_dates)
+        if err is None and status == "active":
+            for agg in aggregators:
+                agg.add(this_mdesc)
+    return aggregators
+
+
+def merge_aggregators(parts):
+    """Merge lists of aggregators, each from consecutive chunks of
+    rows, in order. Returns the first list, with the rest merged in."""
+    merged = parts[0]
+    for part in parts[1:]:
+        for agg, other in zip(merged, part):
+            agg.merge(other)
+    return merged
+
+
+def finish(aggregators, profile=None):
+    """An Info, from aggregators that have seen all rows"""
     info = Info()
-    info.nr = nr
-    info.nad = nad
-    info.last_entity_dt = last_entity_dt
-    info.disabled = disabled
-    info.errors = errors
-    info.mdesc = mdesc
-    info.disabled_mdesc = disabled_mdesc
-    info.meets_ft = meets_ft
-    info.manifests_zfr = manifests_zfr
-    info.etype_count = etype_count
-    info.etype_meets_ft = etype_meets_ft
-    info.erole_count = erole_count
-    info.etype_proj_count = etype_proj_count
-    info.etype_max_fr = etype_max_fr
-    info.lic_map = lic_map
-    info.annual_fin_totals = annual_fin_totals
-    info.used_currencies = used_currencies
-    info.cur_fr = cur_fr
-    info.unused_tags = unused_tags
-    info.tc_list = tc_list
-    info.manifest_fin_count = manifest_fin_count
-    info.tag_count = tag_count
-    info.mc_projects = mc_projects
-    info.mdesc_by_ename = mdesc_by_ename
-    info.prj_map = prj_map
-    info.fin_totals = fin_totals
-    info.ety_clipped_funding = ety_clipped_funding
-    info.ety_clipped_colors = ety_clipped_colors
-    info.fr_below_ft = fr_below_ft
-    info.ety_clipped_sum = ety_clipped_sum
-    info.inaction_days = inaction_days
+    info.profile = profile
+    for agg in aggregators:
+        with _phase(profile, agg.phase):
+            agg.finish(info)
+    return info
 
-    return info, timeseries
+
+def summarize(derived, profile=None, aggregators=None):
+    """Compute info and timeseries from derive_mdesc() output.
+
+    derived must be in CSV row order. aggregators lists the Aggregator
+    classes to run (default_aggregators by default); info gets the
+    attributes each one sets. With a Profile, the pass over the rows
+    and each aggregator's finish() are timed as sub-phases of
+    "summarize".
+    """
+    if aggregators is None:
+        aggregators = default_aggregators
+    aggregators = [make() for make in aggregators]
+    with _phase(profile, "summarize.aggregate"):
+        aggregate(derived, aggregators)
+    info = finish(aggregators, profile)
+    return info, getattr(info, "timeseries", None)
@@ -11,12 +11,12 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import tarfile
-import requests
+import fetch
 import io
+import os
+import render_cache
 import stats
-import matplotlib.pyplot as plt
-import math
+from matplotlib.figure import Figure
 
 # See shortcode list here
 # https://streamlit-emoji-shortcodes-streamlit-app-gwckff.streamlit.app/
@@ -25,59 +25,154 @@ st.set_page_config(
     page_icon=":chart_with_upwards_trend:",
 )
 
-# Get the manifest and extract it in memory
-# FIXME use streamlit's cache system later
-manifest_tgz = "https://dir.floss.fund/funding-manifests.tar.gz"
-rg = requests.get(manifest_tgz)
-mzip = tarfile.open(fileobj=io.BytesIO(rg.content), mode="r:gz")
-manifest_bytes = mzip.extractfile("funding-manifests.csv").read()
-
-# Process the manifest
-info, timeseries = stats.process_csv(io.StringIO(manifest_bytes.decode("utf-8")))
-
-# Funding trend visualization
-# bar overlaid with line
-p1_t = pd.DataFrame(
-    {
-        "New Entities": timeseries["d_manifests"],
-        "d_projects": timeseries["d_projects"],
-        "c_mfr_total_clipped": timeseries["c_mfr_total_clipped"],
-    }
-)
-plt1 = p1_t[["New Entities"]].plot(kind="bar")
-plt2 = p1_t["c_mfr_total_clipped"].plot(secondary_y=True, color="red")
-days_since_launch = len(timeseries["d_manifests"])
-ticks = list(range(0, days_since_launch, 1))
-tick_label = []
-# generic auto-ticks based on number of days, it's kept a multiple of 5
-tick_interval = (((days_since_launch/10)+4)//5)*5
-for val in ticks:
-    if val % tick_interval == 0:
-        tick_label.append(str(val))
+
+# Results are kept across reruns/sessions, and recomputed only when
+# dir.floss.fund has a new snapshot of the dump. The dump is
+# decompressed as it streams in, it's never saved.
+#
+# With FM_PROFILE=1 in the environment, phases are timed on the way
+# (see Diagnostics at the end of the page).
+profiling = os.environ.get("FM_PROFILE", "") not in ("", "0")
+
+
+def process_csv(csvfile):
+    return stats.process_csv(
+        csvfile,
+        profile=stats.Profile() if profiling else None,
+        aggregators=stats.default_aggregators + [stats.FundingChannels],
+    )
+
+
+@st.cache_resource
+def snapshot_cache():
+    return fetch.SnapshotCache(process_csv)
+
+
+# Charts are the same for everyone looking at a snapshot. They are
+# rendered once per snapshot, and kept as PNG. Figures are made with
+# the object oriented matplotlib API, as pyplot's current figure is
+# shared by all the threads serving sessions.
+@st.cache_resource
+def chart_cache():
+    return render_cache.RenderCache()
+
+
+def png(fig):
+    # What st.pyplot() would have sent
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=200, bbox_inches="tight")
+    return buf.getvalue()
+
+
+# How the trend chart can show new entities: (resample period, or
+# rolling window in days)
+trend_views = {
+    "Daily": ("day", None),
+    "Weekly": ("week", None),
+    "Monthly": ("month", None),
+    "7 day rolling": (None, 7),
+    "30 day rolling": (None, 30),
+}
+
+
+def trend_figure(info, timeseries, view="Weekly"):
+    # Funding trend visualization
+    # bar overlaid with line
+    period, window = trend_views[view]
+    if window:
+        series = stats.rolling(timeseries, window)
     else:
-        tick_label.append("")
-plt.xticks(ticks, tick_label)
-plt1.set_xlabel("Days since fund launch")
-plt1.set_ylabel("Entities")
-plt2.set_ylabel("Funds Requested (Million USD)")
+        series = stats.resample(timeseries, period)
+    p1_t = pd.DataFrame(
+        {
+            "New Entities": series["d_manifests"],
+            "d_projects": series["d_projects"],
+            "c_mfr_total_clipped": series["c_mfr_total_clipped"],
+        }
+    )
+    fig = Figure()
+    ax = fig.subplots()
+    # Rolling sums overlap, they read better as a line
+    kind = "line" if window else "bar"
+    plt1 = p1_t[["New Entities"]].plot(kind=kind, ax=ax)
+    plt2 = p1_t["c_mfr_total_clipped"].plot(secondary_y=True, color="red", ax=ax)
+    npoints = len(series["d_manifests"])
+    # generic auto-ticks based on number of points, it's kept a multiple of 5
+    tick_interval = int(max((((npoints/10)+4)//5)*5, 1))
+    ticks = list(range(0, npoints, tick_interval))
+    if period in ["week", "month"]:
+        tick_label = [series["start"][val].item().strftime("%b %Y") for val in ticks]
+        plt1.set_xticks(ticks, tick_label, rotation=45, ha="right")
+        plt1.set_xlabel(view)
+    else:
+        plt1.set_xticks(ticks, [str(val) for val in ticks])
+        plt1.set_xlabel("Days since fund launch")
+    plt1.set_ylabel("Entities")
+    plt2.set_ylabel("Funds Requested (Million USD)")
+    return fig
+
+
+def range_figure(info, timeseries):
+    bins = info.table.funding_bins()
+    fig3 = Figure()
+    ax3 = fig3.subplots()
+    ax3.barh(bins.labels(), bins.counts)
+    ax3.set_xlabel("Number of entities")
+    return fig3
+
+
+def currency_figure(info, timeseries):
+    labels = info.cur_fr.keys()
+    sizes = info.cur_fr.values()
+    explode = [0.1 if currency == "USD" else 0 for currency in labels]  # only "explode" USD
+    fig1 = Figure()
+    ax1 = fig1.subplots()
+    ax1.pie(
+        sizes,
+        explode=explode,
+        labels=labels,
+        autopct="%1.1f%%",
+        shadow=True,
+        # startangle=st_angle,
+        textprops={"fontsize": 6},
+    )
+    ax1.axis("equal")  # Equal aspect ratio ensures that pie is drawn as a circle.
+    return fig1
+
+
+snapshot, (info, timeseries) = snapshot_cache().get_keyed(fetch.manifest_tgz)
+
+
+def chart(make_figure, *args):
+    # Without a snapshot key, there's no telling dumps apart - render
+    # every time
+    key = None if snapshot is None else (snapshot, make_figure.__name__, *args)
+    image = chart_cache().get(
+        key,
+        lambda: png(make_figure(info, timeseries, *args)),
+    )
+    st.image(image, use_container_width=True)
+
+
+days_since_launch = len(timeseries["d_manifests"])
 
 st.title("FLOSS/fund at a glance")
 st.write(
     """
 [FLOSS/fund](https://floss.fund/) is a 1 million USD global fund for FLOSS projects.
 It has been accepting applications since 15th October, 2024. Graph below shows how new
-entities(org, individual, group) are applying on a daily basis, and the trend of the
-cumulative funding requested over time.
+entities(org, individual, group) are applying over time, and the trend of the
+cumulative funding requested.
 """
 )
-st.pyplot(plt)
+view = st.radio("New entities", list(trend_views), index=1, horizontal=True)
+chart(trend_figure, view)
 st.write(
     """
 %d individuals, %d organizations, %d groups have applied for funding.
 This is a cumulative **%d entities** representing **%d projects**, asking for
-**%1.2f Million USD** in funding. Days with no blue bars indicate that no new
-applications were received on that day. There have been %d such days, out of
-%d days that the fund has been active.
+**%1.2f Million USD** in funding. No new applications were received on %d
+days, out of %d days that the fund has been active.
 """
     % (
         info.etype_count["individual"],
@@ -117,19 +212,7 @@ Several projects have funding plans that are less than 10k.
 Graph below shows how many entities fall in specific funding request
 ranges. Complete details of all entities are at the end of this page.
 ''')
-range_occurences = []
-hist_labels = ['< 10k USD']
-range_occurences.append(len(info.fr_below_ft))
-min_val = 10*1000 - 1 # achieves >= in the filter logic, see below
-for max_val in range(20*1000, 100*1000+1, 10*1000):
-    count = len(list(filter(lambda x: ((x>min_val) and x<=max_val), info.ety_clipped_funding[1:])))
-    range_occurences.append(count)
-    hist_labels.append("%sk - %sk USD"%(min_val//1000, max_val//1000))
-    min_val = max_val
-fig3, ax3 = plt.subplots()
-ax3.barh(hist_labels, range_occurences)
-ax3.set_xlabel("Number of entities")
-st.pyplot(fig3)
+chart(range_figure)
 
 st.write('''
 FLOSS/fund is accepting projects. If you know any projects, please refer FLOSS/fund
@@ -144,42 +227,17 @@ Note that funds may be requested in any currency. Here is the spread of funds re
 by currency:
 """
 )
-labels = info.cur_fr.keys()
-sizes = info.cur_fr.values()
-explode = [0.1 if currency == "USD" else 0 for currency in labels]  # only "explode" USD
-fig1, ax1 = plt.subplots()
-ax1.pie(
-    sizes,
-    explode=explode,
-    labels=labels,
-    autopct="%1.1f%%",
-    shadow=True,
-    # startangle=st_angle,
-    textprops={"fontsize": 6},
-)
-ax1.axis("equal")  # Equal aspect ratio ensures that pie is drawn as a circle.
-st.pyplot(fig1)
-
-fc_freq = {}
-for minfo in info.mdesc:
-    fc_names = minfo['funding_channel_names']
-    for t in fc_names:
-        if t in fc_freq:
-            fc_freq[t] += 1
-        else:
-            fc_freq[t] = 1
+chart(currency_figure)
+
 # Don't show for now
-#st.write(fc_freq)
+#st.write(info.fc_freq)
 
 # Highest funding requirements float to the top!
-info.mdesc.sort(key=lambda x: x["funding-plan-max"]["max-fr"], reverse=True)
-freq = []
-freq_ename = []
-for minfo in info.mdesc:
-    mf = minfo["funding-plan-max"]["max-fr"]
-    freq.append(math.floor(mf))
-    manifest = minfo["manifest"]
-    freq_ename.append(manifest["entity"]["name"])
+# (oldest first on ties)
+table = info.table
+by_fr = np.lexsort((table.created_at, -table.max_fr))
+freq = np.floor(table.max_fr[by_fr]).astype(np.int64)
+freq_ename = table.enames[table.ename[by_fr]]
 
 st.write("---")
 st.subheader('Details of Entities')
@@ -194,14 +252,9 @@ but here we show everything as is. Please scroll the list to see all the entries
 df
 
 recent_count = 10
-recent_fr = []
-recent_fr_name = []
-info.mdesc.sort(key=lambda x: x["created_at"],reverse=True)
-for idx, minfo in enumerate(info.mdesc[:recent_count]):
-    mf = minfo["funding-plan-max"]["max-fr"]
-    recent_fr.append(math.floor(mf))
-    manifest = minfo["manifest"]
-    recent_fr_name.append(manifest["entity"]["name"])
+recent = table.order("created_at", reverse=True)[:recent_count]
+recent_fr = np.floor(table.max_fr[recent]).astype(np.int64)
+recent_fr_name = table.enames[table.ename[recent]]
 st.write("---")
 st.subheader('Recent Funding Requests')
 df = pd.DataFrame({"Entity Name": recent_fr_name, "Max Funding Requested (USD)": recent_fr})
@@ -222,6 +275,27 @@ invalid, it is disabled. There are currently %d disabled entities.
 #        manifest = minfo["manifest"]
 #        mnames.append(manifest["entity"]["name"])
 #    st.dataframe({"Entity Name": mnames}, use_container_width=True)
+
+with st.expander("Diagnostics"):
+    if info.profile is not None:
+        st.write('''
+Time taken to process the latest snapshot of the dump, by phase. Reading
+includes the download, as the dump is processed while it streams in.
+''')
+        phases = pd.DataFrame.from_dict(info.profile.phases, orient="index")
+        st.dataframe(phases[["calls", "wall", "cpu"]])
+        st.write("Rows:", info.profile.counters)
+    cache = snapshot_cache()
+    st.write(
+        f"Snapshot cache: {cache.hits} hits, {cache.misses} misses, "
+        f"{cache.bytes_saved / 2**20:.1f} MiB not downloaded again"
+    )
+    charts = chart_cache()
+    st.write(
+        f"Chart cache: {charts.hits} hits, {charts.misses} misses, "
+        f"{len(charts.images)} charts in {charts.size / 1024:.0f} KiB"
+    )
+
 st.subheader('Project Info')
 st.markdown('''
 Details of this project are on
@@ -0,0 +1,199 @@
+#
+# synth
+#
+# Generate synthetic funding-manifests.csv data, to exercise
+# process_csv with many more manifests than the real dump has.
+#
+# The output has the same layout as the dump: header, the localhost
+# test row, then one row per manifest, oldest first. Manifests follow
+# the funding.json schema as far as stats.py looks at it:
+#
+#  - entity types and roles, with some entities filing more than
+#    one manifest
+#  - 1-3 projects, licences spelled in all the ways lic_eq_map and
+#    normalize_license() deal with, tags from project-tags.txt
+#  - 1-3 funding plans, in any currency from currency_weight, some
+#    manifests mixing currencies, a few asking for nothing
+#  - financial history for about half of the manifests
+#  - disabled rows, rows with broken JSON, and a few timestamps
+#    that aren't ISO 8601
+#
+# The same (n, seed) always gives the same file.
+#
+import csv
+import datetime
+import json
+import random
+import stats
+
+# Licences as they appear in manifests. normalize_license() strips the
+# prefixes, lic_eq_map fixes up the rest.
+licenses = (
+    [f"spdx:{lic}" for lic in stats.lic_eq_map]
+    + [
+        "spdx:MIT",
+        "spdx:Apache-2.0",
+        "spdx:GPL-3.0-or-later",
+        "spdx:BSD-2-Clause",
+        "spdx:MPL-2.0",
+        "GNU:AGPL-3.0",
+        "GNU:GPL-3.0",
+    ]
+    + [f"spdx:{lic}" for lic in stats.non_free_licenses]
+)
+etypes = ["individual", "organisation", "group"]
+etype_weights = [60, 30, 10]
+roles = ["owner", "steward", "maintainer", "contributor"]
+currencies = list(stats.currency_weight)
+# Most manifests ask in USD or EUR
+currency_weights = [
+    50 if cur == "USD" else 15 if cur == "EUR" else 5 for cur in currencies
+]
+frequencies = ["one-time", "weekly", "fortnightly", "monthly", "yearly", "other"]
+frequency_weights = [30, 2, 2, 35, 30, 1]
+channel_types = ["bank", "payment-provider", "cheque", "cash", "other"]
+channel_names = ["github", "paypal", "opencollective", "patreon", "liberapay", "bank"]
+# Days the synthetic dump covers, starting at stats.launch_dt
+span_days = 480
+
+
+def load_tags(path="project-tags.txt"):
+    with open(path, encoding="utf-8") as fp:
+        return [line.strip() for line in fp if line.strip()]
+
+
+def timestamp(rng, dt):
+    # The dump uses "2024-10-15 10:46:05.123456+00"
+    if rng.random() < 0.002:
+        return dt.strftime("%a, %d %b %Y %H:%M:%S GMT")
+    return dt.strftime("%Y-%m-%d %H:%M:%S.%f+00")
+
+
+def amount(rng):
+    if rng.random() < 0.05:
+        return 0
+    # Requests span a few hundred to a few hundred thousand
+    return round(10 ** rng.uniform(2.5, 5.7), rng.choice([0, 2]))
+
+
+def manifest(rng, rid, ename, tags):
+    entity = {
+        "type": rng.choices(etypes, etype_weights)[0],
+        "role": rng.choice(roles),
+        "name": ename,
+        "email": f"funding@example{rid}.org",
+        "phone": "",
+        "description": f"{ename} builds free software.\nSince {2000 + rid % 25}.",
+        "webpageUrl": {"url": f"https://example{rid}.org", "wellKnown": ""},
+    }
+    projects = []
+    for idx in range(rng.choices([1, 2, 3], [70, 20, 10])[0]):
+        projects.append(
+            {
+                "guid": f"project-{rid}-{idx}",
+                "name": f"Project {rng.randint(1, 1 + rid // 3)}",
+                "description": "A \"useful\" tool, with commas, and\nnewlines.",
+                "webpageUrl": {"url": f"https://example{rid}.org/p{idx}"},
+                "repositoryUrl": {"url": f"https://git.example{rid}.org/p{idx}"},
+                "licenses": rng.sample(licenses, rng.choice([1, 1, 1, 2])),
+                "tags": rng.sample(tags, rng.randint(0, 5)),
+            }
+        )
+    channels = [
+        {
+            "guid": rng.choice(channel_names),
+            "type": rng.choice(channel_types),
+            "address": "",
+            "description": "",
+        }
+        for _ in range(rng.randint(1, 2))
+    ]
+    primary = rng.choices(currencies, currency_weights)[0]
+    plans = []
+    for idx in range(rng.choices([1, 2, 3], [50, 35, 15])[0]):
+        # About one in ten manifests mixes currencies
+        currency = primary
+        if idx and rng.random() < 0.2:
+            currency = rng.choices(currencies, currency_weights)[0]
+        plans.append(
+            {
+                "guid": f"plan-{idx}",
+                "status": "active",
+                "name": f"Plan {idx}",
+                "description": "",
+                "amount": amount(rng),
+                "currency": currency,
+                "frequency": rng.choices(frequencies, frequency_weights)[0],
+                "channels": [channel["guid"] for channel in channels],
+            }
+        )
+    funding = {"channels": channels, "plans": plans}
+    if rng.random() < 0.5:
+        history = []
+        for year in range(2024 - rng.randint(0, 4), 2025):
+            entry = {
+                "year": year,
+                "income": round(rng.uniform(0, 2e5), 2),
+                "expenses": round(rng.uniform(0, 2e5), 2),
+                "currency": rng.choice([primary, primary, "USD"]),
+                "description": "",
+            }
+            if rng.random() < 0.5:
+                entry["taxes"] = round(rng.uniform(0, 2e4), 2)
+            history.append(entry)
+        funding["history"] = history
+    return {
+        "version": "v1.0.0",
+        "entity": entity,
+        "projects": projects,
+        "funding": funding,
+    }
+
+
+def generate(n, fp, seed=0, tags=None):
+    """Write a CSV with n manifests to the text file fp"""
+    rng = random.Random(seed)
+    if tags is None:
+        tags = load_tags()
+    writer = csv.writer(fp, lineterminator="\n")
+    writer.writerow(
+        ["id", "url", "created_at", "updated_at", "status", "manifest_json"]
+    )
+    writer.writerow(
+        [
+            "1",
+            "http://localhost/funding.json",
+            "2024-10-01 00:00:00.000000+00",
+            "2024-10-01 00:00:00.000000+00",
+            "active",
+            "{}",
+        ]
+    )
+    # Sign ups come in a burst after launch, then slow down
+    offsets = sorted(span_days * rng.random() ** 2 for _ in range(n))
+    # About one in ten entities files more than one manifest
+    nentities = max(1, n - n // 10)
+    for idx, offset in enumerate(offsets):
+        rid = idx + 2
+        created_at = stats.launch_dt + datetime.timedelta(days=offset)
+        updated_at = created_at
+        if rng.random() < 0.3:
+            updated_at += datetime.timedelta(days=rng.uniform(0, 30))
+        ename = f"Entity {rng.randrange(nentities)}"
+        manifest_json = json.dumps(
+            manifest(rng, rid, ename, tags),
+            indent=2 if rng.random() < 0.5 else None,
+        )
+        if rng.random() < 0.003:
+            manifest_json = manifest_json[: len(manifest_json) // 2]
+        status = "disabled" if rng.random() < 0.04 else "active"
+        writer.writerow(
+            [
+                str(rid),
+                f"https://example{rid}.org/funding.json",
+                timestamp(rng, created_at),
+                timestamp(rng, updated_at),
+                status,
+                manifest_json,
+            ]
+        )
@@ -0,0 +1,108 @@
+#
+# Shared fixtures. The tools are flat modules and scripts in the
+# directory above, so that goes on sys.path.
+#
+# dump_server stands in for dir.floss.fund: it serves one snapshot of
+# the dump (a tar.gz holding funding-manifests.csv) with whatever
+# ETag/Last-Modified the test sets, and answers conditional requests
+# with 304 when they match.
+#
+import email.utils
+import http.server
+import io
+import os
+import sys
+import tarfile
+import threading
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fetch
+import synth
+
+tags = ["science", "security", "web", "audio", "database", "education"]
+
+
+def make_csv(n, seed=0):
+    buf = io.StringIO()
+    synth.generate(n, buf, seed, tags=tags)
+    return buf.getvalue()
+
+
+def make_tgz(csv_text):
+    data = csv_text.encode("utf-8")
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz") as tgz:
+        tinfo = tarfile.TarInfo(fetch.manifest_csv)
+        tinfo.size = len(data)
+        tgz.addfile(tinfo, io.BytesIO(data))
+    return buf.getvalue()
+
+
+class DumpServer:
+    def __init__(self):
+        self.body = b""
+        self.etag = None
+        self.last_modified = None
+        # (status, request headers) of every GET, in order
+        self.requests = []
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), self.handler())
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/funding-manifests.tar.gz"
+
+    def publish(self, csv_text, etag=None, last_modified=None):
+        """Serve a new snapshot. last_modified is a datetime"""
+        self.body = make_tgz(csv_text)
+        self.etag = etag
+        self.last_modified = None
+        if last_modified is not None:
+            self.last_modified = email.utils.format_datetime(last_modified, usegmt=True)
+
+    def not_modified(self, headers):
+        # If-None-Match wins over If-Modified-Since (RFC 9110)
+        if headers.get("If-None-Match") is not None:
+            return self.etag is not None and headers["If-None-Match"] == self.etag
+        since = headers.get("If-Modified-Since")
+        if since is None or self.last_modified is None:
+            return False
+        last_modified = email.utils.parsedate_to_datetime(self.last_modified)
+        return last_modified <= email.utils.parsedate_to_datetime(since)
+
+    def handler(self):
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                headers = dict(self.headers)
+                status = 304 if server.not_modified(self.headers) else 200
+                server.requests.append((status, headers))
+                self.send_response(status)
+                if server.etag is not None:
+                    self.send_header("ETag", server.etag)
+                if server.last_modified is not None:
+                    self.send_header("Last-Modified", server.last_modified)
+                if status == 304:
+                    self.end_headers()
+                    return
+                self.send_header("Content-Type", "application/gzip")
+                self.send_header("Content-Length", str(len(server.body)))
+                self.end_headers()
+                self.wfile.write(server.body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def statuses(self):
+        return [status for status, headers in self.requests]
+
+
+@pytest.fixture
+def dump_server():
+    server = DumpServer()
+    thread = threading.Thread(target=server.httpd.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.httpd.shutdown()
+    server.httpd.server_close()
@@ -0,0 +1,103 @@
+import datetime
+import fetch
+from conftest import make_csv
+
+
+def make_cache(max_snapshots=2):
+    processed = []
+
+    def process(csvfile):
+        text = csvfile.read()
+        processed.append(text)
+        return text
+
+    # max_age=0: ask the server every time
+    return fetch.SnapshotCache(process, max_snapshots, max_age=0), processed
+
+
+def test_etag(dump_server):
+    cache, processed = make_cache()
+    first = make_csv(5, seed=1)
+    dump_server.publish(first, etag='"v1"')
+
+    assert cache.get_keyed(dump_server.url) == (('"v1"', None), first)
+    assert cache.get(dump_server.url) == first
+    assert dump_server.statuses() == [200, 304]
+    assert dump_server.requests[1][1]["If-None-Match"] == '"v1"'
+    assert "If-Modified-Since" not in dump_server.requests[1][1]
+    assert processed == [first]
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.bytes_saved == len(dump_server.body)
+
+    second = make_csv(5, seed=2)
+    dump_server.publish(second, etag='"v2"')
+    assert cache.get(dump_server.url) == second
+    assert dump_server.statuses() == [200, 304, 200]
+    assert processed == [first, second]
+    assert cache.misses == 2
+
+
+def test_last_modified(dump_server):
+    cache, processed = make_cache()
+    first = make_csv(5, seed=1)
+    day = datetime.datetime(2025, 3, 1, 6, 0, tzinfo=datetime.UTC)
+    dump_server.publish(first, last_modified=day)
+    size = len(dump_server.body)
+
+    assert cache.get(dump_server.url) == first
+    assert cache.get(dump_server.url) == first
+    assert cache.get(dump_server.url) == first
+    assert dump_server.statuses() == [200, 304, 304]
+    sent = dump_server.requests[1][1]
+    assert "If-None-Match" not in sent
+    assert sent["If-Modified-Since"] == dump_server.last_modified
+    assert processed == [first]
+    assert cache.bytes_saved == 2 * size
+
+    second = make_csv(5, seed=2)
+    dump_server.publish(second, last_modified=day + datetime.timedelta(days=1))
+    assert cache.get(dump_server.url) == second
+    assert dump_server.statuses()[-1] == 200
+    assert processed == [first, second]
+    assert cache.bytes_saved == 2 * size
+
+
+def test_max_age(dump_server):
+    processed = []
+    cache = fetch.SnapshotCache(processed.append, max_age=300)
+    dump_server.publish(make_csv(2), etag='"v1"')
+    cache.get(dump_server.url)
+    cache.get(dump_server.url)
+    # The second one didn't even ask
+    assert dump_server.statuses() == [200]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_eviction(dump_server):
+    cache, processed = make_cache(max_snapshots=2)
+    dumps = [make_csv(3, seed=seed) for seed in range(3)]
+    for idx, text in enumerate(dumps):
+        dump_server.publish(text, etag=f'"v{idx}"')
+        assert cache.get(dump_server.url) == text
+    assert list(cache.results) == [('"v1"', None), ('"v2"', None)]
+    assert list(cache.sizes) == list(cache.results)
+
+    # The server goes back to a snapshot that was evicted: it's
+    # downloaded and processed again
+    dump_server.publish(dumps[0], etag='"v0"')
+    assert cache.get(dump_server.url) == dumps[0]
+    assert processed == dumps + [dumps[0]]
+    assert list(cache.results) == [('"v2"', None), ('"v0"', None)]
+
+
+def test_no_validators(dump_server):
+    cache, processed = make_cache()
+    text = make_csv(2)
+    dump_server.publish(text)
+    assert cache.get_keyed(dump_server.url) == (None, text)
+    assert cache.get_keyed(dump_server.url) == (None, text)
+    # Nothing to revalidate with, so nothing is cached
+    assert dump_server.statuses() == [200, 200]
+    assert "If-None-Match" not in dump_server.requests[1][1]
+    assert processed == [text, text]
+    assert not cache.results
@@ -0,0 +1,91 @@
+import datetime
+import importlib.util
+import os
+import sqlite3
+import pytest
+import sqlite3_adapters
+import manifest_db
+from conftest import make_csv
+
+path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "manifest-history.py")
+spec = importlib.util.spec_from_file_location("manifest_history", path)
+manifest_history = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(manifest_history)
+
+day = datetime.datetime(2025, 3, 1, 6, 0, tzinfo=datetime.UTC)
+
+
+@pytest.fixture
+def conn(tmp_path):
+    sqlite3_adapters.register_datetime()
+    conn = sqlite3.connect(
+        tmp_path / "history.db",
+        detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+    )
+    conn.execute(
+        "CREATE TABLE mdb_history"
+        "(fetched_at DATETIME, url TEXT, last_modified DATETIME, data BLOB)"
+    )
+    manifest_db.init_history(conn)
+    yield conn
+    conn.close()
+
+
+def stored(conn, store):
+    if store == "dedup":
+        return [
+            row[0]
+            for row in conn.execute(
+                "SELECT last_modified FROM mdb_snapshot ORDER BY last_modified"
+            )
+        ]
+    return [
+        row[0]
+        for row in conn.execute(
+            "SELECT last_modified FROM mdb_history ORDER BY last_modified"
+        )
+    ]
+
+
+@pytest.mark.parametrize("store", ["blob", "dedup"])
+def test_update(dump_server, conn, store, capsys):
+    dump_server.publish(make_csv(5, seed=1), etag='"v1"', last_modified=day)
+    size = len(dump_server.body)
+
+    manifest_history.update_hist(dump_server.url, conn, store)
+    assert dump_server.statuses() == [200]
+    assert "If-Modified-Since" not in dump_server.requests[0][1]
+    assert stored(conn, store) == [day]
+    assert "Inserting manifest db" in capsys.readouterr().out
+
+    # Nothing new: the server says so, and the body isn't sent
+    manifest_history.update_hist(dump_server.url, conn, store)
+    assert dump_server.statuses() == [200, 304]
+    assert dump_server.requests[1][1]["If-Modified-Since"] == dump_server.last_modified
+    out = capsys.readouterr().out
+    assert "not modified since" in out
+    if store == "blob":
+        # Only blobs have their size stored
+        assert f"skipped downloading {size} bytes" in out
+    assert stored(conn, store) == [day]
+
+    later = day + datetime.timedelta(days=1)
+    dump_server.publish(make_csv(6, seed=2), etag='"v2"', last_modified=later)
+    manifest_history.update_hist(dump_server.url, conn, store)
+    assert dump_server.statuses() == [200, 304, 200]
+    assert stored(conn, store) == [day, later]
+
+
+def test_update_server_ignores_conditions(dump_server, conn, capsys):
+    dump_server.publish(make_csv(5), last_modified=day)
+    manifest_history.update_hist(dump_server.url, conn, "blob")
+    capsys.readouterr()
+
+    # A server that doesn't do conditional requests: the snapshot is
+    # recognised by its Last-Modified, and the body isn't read
+    dump_server.not_modified = lambda headers: False
+    manifest_history.update_hist(dump_server.url, conn, "blob")
+    out = capsys.readouterr().out
+    assert "already available in history" in out
+    assert f"skipped downloading {len(dump_server.body)} bytes" in out
+    assert stored(conn, "blob") == [day]
@@ -0,0 +1,36 @@
+import pytest
+import stats
+from conftest import make_csv
+
+
+class Names(stats.Aggregator):
+    # No merge(): fine for the serial path, not for shards
+    def __init__(self):
+        self.names = []
+
+    def add(self, this_mdesc):
+        self.names.append(this_mdesc.ename)
+
+    def finish(self, info):
+        info.names = self.names
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "funding-manifests.csv"
+    path.write_text(make_csv(20), encoding="utf-8")
+    return path
+
+
+def test_unmergeable_serial(csv_path):
+    with open(csv_path, encoding="utf-8", newline="") as csvfile:
+        info, timeseries = stats.process_csv(csvfile, aggregators=[Names])
+    assert len(info.names) > 0
+
+
+def test_unmergeable_shards(csv_path):
+    with open(csv_path, encoding="utf-8", newline="") as csvfile:
+        with pytest.raises(TypeError, match="Names"):
+            stats.process_csv(
+                csvfile, aggregators=[stats.RowCounts, Names], shards=2
+            )